@@ -0,0 +1,35 @@
+"""
+Индекс администраторов: множество user_id из ADMIN_IDS и пользователей,
+чей нормализованный телефон указан в ADMIN_PHONES.
+"""
+import re
+from typing import Iterable, Set
+
+_NON_DIGITS = re.compile(r"\D+")
+
+
+def normalize_phone(phone: str) -> str:
+    """Оставляет только цифры; российский номер с 8 в начале приводится к 7."""
+    digits = _NON_DIGITS.sub("", phone or "")
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    return digits
+
+
+class AdminIndex:
+    def __init__(self, admin_ids: Iterable[int], admin_phones: Iterable[str]) -> None:
+        self._static_ids: Set[int] = set(admin_ids)
+        self.phones: Set[str] = {normalize_phone(phone) for phone in admin_phones} - {""}
+        self._phone_ids: Set[int] = set()
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._static_ids or user_id in self._phone_ids
+
+    def load(self, user_ids: Iterable[int]) -> None:
+        self._phone_ids = set(user_ids)
+
+    def update(self, user_id: int, phone: str) -> None:
+        if normalize_phone(phone) in self.phones:
+            self._phone_ids.add(user_id)
+        else:
+            self._phone_ids.discard(user_id)
@@ -0,0 +1,305 @@
+"""
+Асинхронный фасад над bot.db.
+
+Чтения выполняются в пуле читателей, записи — в очереди единственного
+писателя (см. bot.storage), поэтому медленный запрос не блокирует цикл
+событий, а рейтинг не ждет записи активностей.
+"""
+import asyncio
+import functools
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from bot import db
+from bot.admins import AdminIndex
+from bot.cache import TTLCache
+from bot.config import settings
+from bot.ingest import ActivityBuffer, ActivityRow
+from bot.leaderboard import HISTORY_DAYS, PERIOD_DAYS, LeaderboardEngine
+
+format_period = db.format_period
+# Справочник категорий; заполняется init_db или load_categories
+categories = db.categories
+
+# Рейтинги в памяти; до вызова load_leaderboard запросы идут в базу
+leaderboard: Optional[LeaderboardEngine] = None
+
+# Готовые рейтинги: (category, period) -> (строки, текст сообщения)
+leaderboard_cache: TTLCache[Tuple[str, str], Tuple[List[Any], str]] = TTLCache(
+    maxsize=settings.leaderboard_cache_size, ttl=settings.leaderboard_cache_ttl
+)
+
+# Строки users для проверок доступа. Хранится и отсутствие пользователя (None),
+# last_activity_at здесь может отставать — для профиля есть get_profile.
+user_cache: TTLCache[int, Optional[sqlite3.Row]] = TTLCache(
+    maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl or None
+)
+_MISSING = object()
+
+admin_index = AdminIndex(settings.admin_ids, settings.admin_phones)
+
+
+async def _read(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        db.storage.reader_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+async def _write(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        db.storage.writer_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+async def init_db() -> None:
+    await _write(db.init_db)
+
+
+async def load_categories() -> None:
+    await _read(db.load_categories)
+
+
+async def add_user(user_id: int, full_name: str, phone: str, city: str, age: int) -> None:
+    await _write(db.add_user, user_id, full_name, phone, city, age)
+    admin_index.update(user_id, phone)
+    await _refresh_user(user_id)
+    # Имя и город могли измениться, а одобренный пользователь снова уходит на проверку
+    leaderboard_cache.invalidate()
+    if leaderboard is not None:
+        leaderboard.set_profile(user_id, full_name, city)
+        leaderboard.set_status(user_id, "pending")
+
+
+async def get_user(user_id: int) -> Optional[sqlite3.Row]:
+    cached = user_cache.get(user_id, _MISSING)
+    if cached is not _MISSING:
+        return cached
+    stamp = user_cache.stamp
+    user = await _read(db.get_user, user_id)
+    user_cache.set(user_id, user, stamp=stamp)
+    return user
+
+
+async def _refresh_user(user_id: int) -> None:
+    user_cache.pop(user_id)
+    stamp = user_cache.stamp
+    user_cache.set(user_id, await _read(db.get_user, user_id), stamp=stamp)
+
+
+async def load_admin_index() -> None:
+    admin_index.load(await _read(db.get_user_ids_by_phones, admin_index.phones))
+
+
+async def warm_user_cache() -> None:
+    for user in await _read(db.get_recent_users, user_cache.maxsize):
+        user_cache.set(user["user_id"], user)
+
+
+async def set_user_status(user_id: int, status: str) -> None:
+    previous = await get_user(user_id)
+    await _write(db.set_user_status, user_id, status)
+    await _refresh_user(user_id)
+    was_approved = bool(previous and previous["status"] == "approved")
+    if was_approved != (status == "approved"):
+        leaderboard_cache.invalidate()
+    if leaderboard is not None:
+        leaderboard.set_status(user_id, status)
+
+
+async def add_activities(rows: List[ActivityRow]) -> None:
+    await _write(db.add_activities, rows)
+    touched = {category for _, category, _, _ in rows}
+    leaderboard_cache.invalidate(lambda key: key[0] in touched)
+    if leaderboard is not None:
+        for user_id, category, value, created_at in rows:
+            leaderboard.record(user_id, category, value, datetime.utcfromtimestamp(created_at))
+
+
+activity_buffer = ActivityBuffer(
+    add_activities,
+    flush_interval=settings.activity_flush_interval_ms / 1000,
+    max_rows=settings.activity_flush_max_rows,
+)
+
+
+async def add_activity(user_id: int, category: str, value: float) -> None:
+    # Неизвестная категория отклоняется сразу, а не при записи всей пачки
+    categories.id_of(category)
+    await activity_buffer.add(user_id, category, value)
+
+
+async def list_pending_users() -> List[sqlite3.Row]:
+    return await _read(db.list_pending_users)
+
+
+async def list_users_by_status(statuses: Sequence[str]) -> List[sqlite3.Row]:
+    return await _read(db.list_users_by_status, statuses)
+
+
+async def list_users_page(
+    statuses: Sequence[str],
+    limit: int,
+    after: Optional[db.UserCursor] = None,
+    before: Optional[db.UserCursor] = None,
+) -> Tuple[List[sqlite3.Row], bool, bool]:
+    return await _read(db.list_users_page, statuses, limit, after, before)
+
+
+async def get_leaderboard(category: str, since: Optional[datetime]) -> List[sqlite3.Row]:
+    return await _read(db.get_leaderboard, category, since)
+
+
+def _build_leaderboard() -> LeaderboardEngine:
+    today = datetime.utcnow().date()
+    users, daily, all_time = db.get_leaderboard_snapshot(today - timedelta(days=HISTORY_DAYS))
+    return LeaderboardEngine.from_snapshot(users, daily, all_time, today)
+
+
+async def load_leaderboard() -> None:
+    """Загружает рейтинги в память. Вызывается при старте, до приема обновлений."""
+    global leaderboard
+    leaderboard = await _read(_build_leaderboard)
+
+
+async def get_period_leaderboard(category: str, period: str) -> List[Any]:
+    if leaderboard is not None and period in PERIOD_DAYS:
+        return leaderboard.top(category, period)
+    return await get_leaderboard(category, format_period(period))
+
+
+async def get_personal_stats(user_id: int, category: str, since: Optional[datetime]) -> float:
+    return await _read(db.get_personal_stats, user_id, category, since)
+
+
+async def get_stats_matrix(
+    user_ids: Sequence[int], categories: Sequence[str], periods: Sequence[str]
+) -> Dict[Tuple[int, str, str], float]:
+    return await _read(db.get_stats_matrix, user_ids, categories, periods)
+
+
+async def get_personal_all_stats(user_id: int) -> List[Tuple[str, str, float]]:
+    return await _read(db.get_personal_all_stats, user_id)
+
+
+async def get_profile(user_id: int) -> Optional[sqlite3.Row]:
+    return await _read(db.get_profile, user_id)
+
+
+async def iter_users(
+    statuses: Sequence[str], chunk_size: int = db.USER_SCAN_CHUNK, columns: Sequence[str] = ("user_id",)
+) -> AsyncIterator[sqlite3.Row]:
+    """Асинхронный проход по пользователям: каждая порция читается в пуле читателей."""
+    after: Optional[int] = None
+    while True:
+        chunk = await _read(db.get_users_chunk, statuses, after, chunk_size, columns)
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1]["user_id"]
+
+
+async def get_registered_users(statuses: Sequence[str]) -> AsyncIterator[int]:
+    async for row in iter_users(statuses):
+        yield row["user_id"]
+
+
+async def get_bot_state(key: str) -> Optional[str]:
+    return await _read(db.get_bot_state, key)
+
+
+async def set_bot_state(key: str, value: str) -> None:
+    await _write(db.set_bot_state, key, value)
+
+
+async def create_broadcast_job(admin_chat_id: int, text: str, statuses: Sequence[str]) -> int:
+    return await _write(db.create_broadcast_job, admin_chat_id, text, statuses)
+
+
+async def set_broadcast_progress_message(job_id: int, message_id: int) -> None:
+    await _write(db.set_broadcast_progress_message, job_id, message_id)
+
+
+async def list_unfinished_broadcasts() -> List[sqlite3.Row]:
+    return await _read(db.list_unfinished_broadcasts)
+
+
+async def get_broadcast_job(job_id: int) -> Optional[sqlite3.Row]:
+    return await _read(db.get_broadcast_job, job_id)
+
+
+async def get_pending_recipients(job_id: int, after_user_id: int, limit: int) -> List[int]:
+    return await _read(db.get_pending_recipients, job_id, after_user_id, limit)
+
+
+async def save_broadcast_results(
+    job_id: int, results: Sequence[Tuple[int, str, int, Optional[str]]]
+) -> None:
+    await _write(db.save_broadcast_results, job_id, results)
+
+
+async def get_broadcast_counts(job_id: int) -> Dict[str, int]:
+    return await _read(db.get_broadcast_counts, job_id)
+
+
+async def finish_broadcast_job(job_id: int, status: str = "done") -> None:
+    await _write(db.finish_broadcast_job, job_id, status)
+
+
+async def enqueue_notification(
+    chat_id: int,
+    text: str,
+    reply_markup: Optional[str],
+    compact: bool,
+    dedup_key: Optional[str],
+    not_before: float,
+) -> None:
+    await _write(db.enqueue_notification, chat_id, text, reply_markup, compact, dedup_key, not_before)
+
+
+async def claim_notifications(now: float, limit: int, shard: int = 0, shards: int = 1) -> List[sqlite3.Row]:
+    return await _write(db.claim_notifications, now, limit, shard, shards)
+
+
+async def release_claimed_notifications(shard: int = 0, shards: int = 1) -> int:
+    return await _write(db.release_claimed_notifications, shard, shards)
+
+
+async def get_next_notification_time(shard: int = 0, shards: int = 1) -> Optional[float]:
+    return await _read(db.get_next_notification_time, shard, shards)
+
+
+async def complete_notifications(results: Sequence[Tuple[int, str, int, float, Optional[str]]]) -> None:
+    await _write(db.complete_notifications, results)
+
+
+async def get_last_message_id(chat_id: int) -> Optional[int]:
+    return await _read(db.get_last_message_id, chat_id)
+
+
+async def save_last_message_ids(rows: Sequence[Tuple[int, int]]) -> None:
+    await _write(db.save_last_message_ids, rows)
+
+
+async def get_fsm_record(key: str) -> Optional[sqlite3.Row]:
+    return await _read(db.get_fsm_record, key)
+
+
+async def save_fsm_records(
+    upserts: Sequence[Tuple[str, Optional[str], str, float]], deletes: Sequence[str]
+) -> None:
+    await _write(db.save_fsm_records, upserts, deletes)
+
+
+async def delete_expired_fsm_records(before: float) -> int:
+    return await _write(db.delete_expired_fsm_records, before)
+
+
+async def shutdown() -> None:
+    try:
+        await activity_buffer.close()
+    finally:
+        db.close_connections()
@@ -0,0 +1,6 @@
+"""
+Нагрузочные замеры бота.
+
+python -m bot.benchmarks.db_bench — запросы bot.db на синтетических данных.
+python -m bot.benchmarks.handler_bench — обработчики под нагрузкой с поддельным Bot API.
+"""
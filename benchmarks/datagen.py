@@ -0,0 +1,106 @@
+"""
+Генератор синтетических данных для замеров.
+
+Заполняет уже инициализированную базу (db.init_db) пользователями и
+активностями с правдоподобными распределениями: большинство участников
+одобрены, активность распределена по закону Парето (немногие пишут
+много), недавние дни заполнены плотнее старых. При одинаковом seed
+данные повторяются, поэтому результаты разных коммитов сравнимы.
+"""
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+
+from bot import db
+
+DAY = 86400
+
+STATUS_WEIGHTS = {"approved": 0.85, "pending": 0.08, "banned": 0.07}
+
+CATEGORY_WEIGHTS = {"pushups": 0.3, "squats": 0.25, "pullups": 0.1, "running": 0.2, "reading": 0.15}
+
+CITIES = ["Москва", "Санкт-Петербург", "Казань", "Новосибирск", "Екатеринбург", "Самара", "Пермь", "Томск"]
+
+
+def _value_generators(rng: random.Random) -> Dict[str, Callable[[], float]]:
+    return {
+        "pushups": lambda: float(rng.randint(10, 60)),
+        "squats": lambda: float(rng.randint(15, 80)),
+        "pullups": lambda: float(rng.randint(3, 20)),
+        "running": lambda: round(rng.lognormvariate(1.5, 0.5), 1),
+        "reading": lambda: float(rng.randint(5, 80)),
+    }
+
+
+def generate(
+    users: int, activities: int, seed: int = 42, days: int = 365, chunk_size: int = 100_000
+) -> Dict[str, float]:
+    """Добавляет users пользователей и activities активностей; возвращает время этапов в секундах."""
+    rng = random.Random(seed)
+    now = int(time.time())
+    timings: Dict[str, float] = {}
+
+    started = time.perf_counter()
+    statuses = rng.choices(list(STATUS_WEIGHTS), weights=list(STATUS_WEIGHTS.values()), k=users)
+    user_rows = [
+        (
+            user_id,
+            f"Участник {user_id}",
+            f"+7{rng.randrange(9000000000, 9999999999)}",
+            rng.choice(CITIES),
+            rng.randint(16, 70),
+            statuses[user_id - 1],
+            now - rng.randrange(2 * 365 * DAY),
+        )
+        for user_id in range(1, users + 1)
+    ]
+    with db.get_connection() as conn:
+        conn.executemany(
+            """
+            INSERT INTO users (user_id, full_name, phone, city, age, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            user_rows,
+        )
+    timings["users"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    categories = db.load_categories()
+    keys = categories.keys()
+    weights = [CATEGORY_WEIGHTS.get(key, 0.05) for key in keys]
+    category_ids = [categories.id_of(key) for key in keys]
+    values = _value_generators(rng)
+    value_of = [values.get(key, lambda: float(rng.randint(1, 30))) for key in keys]
+    # Немногие пользователи пишут большую часть активностей
+    activity_weights = [rng.paretovariate(1.2) for _ in range(users)]
+    user_ids = list(range(1, users + 1))
+    last_activity: Dict[int, int] = {}
+    remaining = activities
+    while remaining > 0:
+        count = min(chunk_size, remaining)
+        remaining -= count
+        picked_users = rng.choices(user_ids, weights=activity_weights, k=count)
+        picked_categories = rng.choices(range(len(keys)), weights=weights, k=count)
+        rows: List[Tuple[int, int, float, int]] = []
+        for user_id, index in zip(picked_users, picked_categories):
+            # Квадрат равномерного распределения: недавние дни плотнее
+            created_at = now - int(days * DAY * rng.random() ** 2)
+            rows.append((user_id, category_ids[index], value_of[index](), created_at))
+            if created_at > last_activity.get(user_id, 0):
+                last_activity[user_id] = created_at
+        with db.get_connection() as conn:
+            conn.executemany(
+                "INSERT INTO activities (user_id, category_id, value, created_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+    with db.get_connection() as conn:
+        conn.executemany(
+            "UPDATE users SET last_activity_at = ? WHERE user_id = ?",
+            [(created_at, user_id) for user_id, created_at in last_activity.items()],
+        )
+    timings["activities"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    db.backfill_daily_rollup()
+    timings["rollup"] = time.perf_counter() - started
+    return timings
@@ -0,0 +1,209 @@
+"""
+Замеры функций bot.db на синтетической базе.
+
+    python -m bot.benchmarks.db_bench --users 100000 --activities 10000000 --output bench.json
+
+База создается во временном каталоге (или по пути --db; если там уже есть
+данные, генерация пропускается — удобно для повторных прогонов на
+большом объеме). Результат — JSON: параметры прогона, коммит и для
+каждого замера время в миллисекундах (min, median, p95, mean) или
+пропускная способность в строках в секунду.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+PERIODS = ["day", "week", "month", "year", "all"]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Замеры запросов bot.db")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--activities", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов каждого запроса")
+    parser.add_argument("--writes", type=int, default=2000, help="Строк для замера записи")
+    parser.add_argument("--db", help="Путь к базе; по умолчанию временный файл")
+    parser.add_argument("--output", help="Файл для JSON; по умолчанию stdout")
+    return parser.parse_args()
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[max(0, int(len(ordered) * 0.95) - 1)] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    func()  # прогрев: кэш страниц и подготовленных запросов
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(args: argparse.Namespace, db_path: str) -> Dict[str, Any]:
+    # bot.config читает окружение при импорте, поэтому путь к базе задаем до него
+    os.environ["DATABASE_PATH"] = db_path
+    for name in ("BOT_TOKEN", "ADMIN_IDS", "ADMIN_PHONES"):
+        os.environ.setdefault(name, "")
+
+    from bot import db
+    from bot.benchmarks.datagen import generate
+    from bot.leaderboard import HISTORY_DAYS, LeaderboardEngine
+
+    db.init_db()
+    with db.get_read_connection() as conn:
+        existing_users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    generation: Dict[str, float] = {}
+    if not existing_users:
+        generation = generate(args.users, args.activities, seed=args.seed)
+    with db.get_read_connection() as conn:
+        users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        activities = conn.execute("SELECT COUNT(*) FROM activities").fetchone()[0]
+        phones = [row[0] for row in conn.execute("SELECT phone FROM users LIMIT 20")]
+    rng = random.Random(args.seed)
+    random_user = lambda: rng.randint(1, users)
+    repeat = args.repeat
+    results: Dict[str, Any] = {}
+
+    for category in db.categories.keys():
+        for period in PERIODS:
+            since = db.format_period(period)
+            results[f"get_leaderboard[{category},{period}]"] = measure(
+                lambda: db.get_leaderboard(category, since), repeat
+            )
+    # Скользящие сутки: неполный первый день читается из activities
+    rolling = datetime.utcnow() - timedelta(hours=24)
+    results["get_leaderboard[pushups,rolling24h]"] = measure(
+        lambda: db.get_leaderboard("pushups", rolling), repeat
+    )
+    results["get_personal_stats[week]"] = measure(
+        lambda: db.get_personal_stats(random_user(), "pushups", db.format_period("week")), repeat
+    )
+    results["get_personal_all_stats"] = measure(lambda: db.get_personal_all_stats(random_user()), repeat)
+    results["get_stats_matrix[100 users]"] = measure(
+        lambda: db.get_stats_matrix(
+            [random_user() for _ in range(100)], db.categories.keys(), ["day", "week", "month"]
+        ),
+        repeat,
+    )
+    results["get_user"] = measure(lambda: db.get_user(random_user()), repeat)
+    results["get_profile"] = measure(lambda: db.get_profile(random_user()), repeat)
+    results["get_recent_users[1000]"] = measure(lambda: db.get_recent_users(1000), repeat)
+    results["get_user_ids_by_phones[20]"] = measure(lambda: db.get_user_ids_by_phones(phones), repeat)
+    results["list_pending_users"] = measure(db.list_pending_users, repeat)
+    results["list_users_by_status[approved,pending]"] = measure(
+        lambda: db.list_users_by_status(["approved", "pending"]), max(3, repeat // 4)
+    )
+    first_page, _, _ = db.list_users_page(["approved", "pending"], 25)
+    results["list_users_page[first]"] = measure(
+        lambda: db.list_users_page(["approved", "pending"], 25), repeat
+    )
+    with db.get_read_connection() as conn:
+        middle = conn.execute(
+            "SELECT created_at, user_id FROM users ORDER BY created_at LIMIT 1 OFFSET ?", (users // 2,)
+        ).fetchone()
+    if middle is not None:
+        cursor = (middle["created_at"], middle["user_id"])
+        results["list_users_page[middle]"] = measure(
+            lambda: db.list_users_page(["approved", "pending"], 25, after=cursor), repeat
+        )
+    results["iter_users[approved]"] = measure(
+        lambda: sum(1 for _ in db.iter_users(["approved"])), max(3, repeat // 4)
+    )
+
+    def build_engine() -> LeaderboardEngine:
+        today = datetime.utcnow().date()
+        snapshot = db.get_leaderboard_snapshot(today - timedelta(days=HISTORY_DAYS))
+        return LeaderboardEngine.from_snapshot(*snapshot, today)
+
+    results["leaderboard_snapshot+engine"] = measure(build_engine, max(3, repeat // 4))
+
+    keys = db.categories.keys()
+    started = time.perf_counter()
+    for _ in range(args.writes):
+        db.add_activity(random_user(), rng.choice(keys), 10.0)
+    elapsed = time.perf_counter() - started
+    results["add_activity"] = {"rows": args.writes, "rows_per_sec": round(args.writes / elapsed, 1)}
+
+    now = int(time.time())
+    batch = [(random_user(), rng.choice(keys), 10.0, now) for _ in range(200)]
+    batches = max(1, args.writes // len(batch))
+    started = time.perf_counter()
+    for _ in range(batches):
+        db.add_activities(batch)
+    elapsed = time.perf_counter() - started
+    results["add_activities[200]"] = {
+        "rows": batches * len(batch),
+        "rows_per_sec": round(batches * len(batch) / elapsed, 1),
+    }
+    db.close_connections()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": repeat,
+            "users": users,
+            "activities": activities,
+            "generated": bool(generation),
+        },
+        "generation_sec": {name: round(seconds, 3) for name, seconds in generation.items()},
+        "results": results,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    if args.db:
+        report = run(args, args.db)
+    else:
+        with tempfile.TemporaryDirectory(prefix="bot-bench-") as directory:
+            report = run(args, os.path.join(directory, "bench.db"))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Нагрузочный прогон обработчиков без Telegram.
+
+    python -m bot.benchmarks.handler_bench --users 500 --concurrency 50 --output handlers.json
+
+Синтетические Update подаются в dp.feed_update, а бот работает через
+FakeTelegramSession из bot.fake_telegram: она отвечает на вызовы API
+локально (с задержкой --api-latency) и считает их. Каждый пользователь
+проходит сценарий регистрация → одобрение админом → запись активности →
+рейтинг → профиль; админ по ходу прогона запускает рассылку. Фоновые рассылка и
+очередь уведомлений работают как в боевом режиме. Итог — JSON с
+p50/p95/p99 задержки по шагам и пропускной способностью.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+ADMIN_ID = 1
+FIRST_USER_ID = 1000
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон обработчиков бота")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="Одновременно идущих сценариев")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Задержка ответа API, мс")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Файл для JSON; по умолчанию stdout")
+    return parser.parse_args()
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pick(share: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * share))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+async def run(args: argparse.Namespace, db_path: str) -> Dict[str, Any]:
+    # bot.config читает окружение при импорте
+    os.environ["DATABASE_PATH"] = db_path
+    os.environ["BOT_TOKEN"] = "123456:BENCHMARK"
+    os.environ["ADMIN_IDS"] = str(ADMIN_ID)
+    os.environ.setdefault("ADMIN_PHONES", "")
+
+    from aiogram import Bot
+    from aiogram.types import Update
+
+    from bot import async_db
+    from bot import main as app
+    from bot.fake_telegram import FakeTelegramSession
+
+    await async_db.init_db()
+    await async_db.load_leaderboard()
+    await async_db.warm_user_cache()
+    await async_db.load_admin_index()
+
+    session = FakeTelegramSession(args.api_latency / 1000)
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    broadcaster, outbox = app.create_services(bot, send_rate=1_000_000)
+    outbox.start()
+    app.fsm_storage.start()
+    app.scheduler.start()
+
+    rng = random.Random(args.seed)
+    update_ids = itertools.count(1)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Counter = Counter()
+
+    def user(user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"Участник {user_id}"}
+
+    def message(user_id: int, text: str) -> Dict[str, Any]:
+        update_id = next(update_ids)
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": user(user_id),
+                "text": text,
+            },
+        }
+
+    def callback(user_id: int, data: str) -> Dict[str, Any]:
+        update_id = next(update_ids)
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "text": "menu",
+                },
+            },
+        }
+
+    async def feed(step: str, payload: Dict[str, Any]) -> None:
+        update = Update.model_validate(payload, context={"bot": bot})
+        started = time.perf_counter()
+        try:
+            await app.dp.feed_update(bot, update, broadcaster=broadcaster, outbox=outbox)
+        except Exception as exc:
+            errors[f"{step}: {type(exc).__name__}"] += 1
+        latencies[step].append(time.perf_counter() - started)
+
+    async def user_journey(user_id: int) -> None:
+        await feed("start", message(user_id, "/start"))
+        await feed("register", message(user_id, "🚀 Регистрация"))
+        await feed("register_name", message(user_id, f"Участник Тестовый {user_id}"))
+        await feed("register_phone", message(user_id, f"+7900{user_id:07d}"))
+        await feed("register_city", message(user_id, rng.choice(["Москва", "Казань", "Пермь"])))
+        await feed("register_age", message(user_id, str(rng.randint(18, 60))))
+        await feed("approve", callback(ADMIN_ID, f"approve:{user_id}"))
+        category = rng.choice(async_db.categories.keys())
+        for _ in range(rng.randint(1, 3)):
+            await feed("record", message(user_id, "✍️ Записать"))
+            await feed("record_category", callback(user_id, f"activity:{category}"))
+            await feed("record_value", message(user_id, str(rng.randint(5, 50))))
+        await feed("rating", message(user_id, "🏆 Рейтинг"))
+        await feed("rating_category", callback(user_id, f"rating:{category}"))
+        await feed("rating_period", callback(user_id, f"period:{category}:{rng.choice(['day', 'week', 'month'])}"))
+        await feed("about", message(user_id, "ℹ️ О себе"))
+
+    async def admin_journey(started: asyncio.Event) -> None:
+        await started.wait()
+        await feed("admin_members", message(ADMIN_ID, "👥 Участники"))
+        await feed("broadcast", message(ADMIN_ID, "📢 Рассылка"))
+        await feed("broadcast_text", message(ADMIN_ID, "Нагрузочный прогон: всем привет!"))
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    halfway = asyncio.Event()
+    finished = 0
+
+    async def limited(user_id: int) -> None:
+        nonlocal finished
+        async with semaphore:
+            await user_journey(user_id)
+        finished += 1
+        if finished >= args.users // 2:
+            halfway.set()
+
+    started_at = time.perf_counter()
+    try:
+        await asyncio.gather(
+            admin_journey(halfway),
+            *(limited(FIRST_USER_ID + index) for index in range(args.users)),
+        )
+        handlers_elapsed = time.perf_counter() - started_at
+        # Ждем фоновые рассылку и уведомления, чтобы учесть их вызовы API
+        deadline = time.monotonic() + 60
+        while await async_db.list_unfinished_broadcasts() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        total_elapsed = time.perf_counter() - started_at
+        scheduler_stats = app.scheduler.stats()
+    finally:
+        await app.close_services(broadcaster, outbox)
+        await bot.session.close()
+
+    all_samples = [sample for samples in latencies.values() for sample in samples]
+    return {
+        "meta": {
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "api_latency_ms": args.api_latency,
+            "seed": args.seed,
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        },
+        "updates": len(all_samples),
+        "elapsed_sec": round(handlers_elapsed, 3),
+        "elapsed_with_background_sec": round(total_elapsed, 3),
+        "updates_per_sec": round(len(all_samples) / handlers_elapsed, 1) if handlers_elapsed else 0.0,
+        "latency": percentiles(all_samples) if all_samples else {},
+        "steps": {step: percentiles(samples) for step, samples in sorted(latencies.items())},
+        "api_calls": dict(session.calls.most_common()),
+        "scheduler": scheduler_stats,
+        "errors": dict(errors),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="bot-handlers-") as directory:
+        report = asyncio.run(run(args, os.path.join(directory, "bench.db")))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
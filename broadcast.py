@@ -0,0 +1,204 @@
+"""
+Рассылки с сохранением прогресса.
+
+Задача и статус каждого получателя хранятся в SQLite, поэтому после
+перезапуска рассылка продолжается с неотправленных получателей.
+Отправка идет параллельно под общим ограничителем скорости, ошибки
+повторяются с экспоненциальной задержкой, а retry_after от Telegram
+приостанавливает всю отправку и попыткой не считается.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+from bot import async_db
+from bot.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+BroadcastResult = Tuple[int, str, int, Optional[str]]
+
+
+class Broadcaster:
+    # Сколько получателей читать из базы за раз и как часто сохранять итоги
+    CHUNK_SIZE = 500
+    FLUSH_EVERY = 200
+    FLUSH_INTERVAL = 1.0
+    PROGRESS_INTERVAL = 3.0
+
+    def __init__(
+        self,
+        bot: Bot,
+        bucket: TokenBucket,
+        concurrency: int = 20,
+        max_attempts: int = 5,
+    ) -> None:
+        self.bot = bot
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    async def start(self, admin_chat_id: int, text: str, statuses: List[str]) -> int:
+        job_id = await async_db.create_broadcast_job(admin_chat_id, text, statuses)
+        try:
+            counts = await async_db.get_broadcast_counts(job_id)
+            progress = await self.bot.send_message(
+                admin_chat_id, self._progress_text(job_id, counts, finished=False)
+            )
+            await async_db.set_broadcast_progress_message(job_id, progress.message_id)
+        finally:
+            # Задача уже в базе: запускаем ее, даже если сообщение о прогрессе не ушло
+            self._spawn(job_id)
+        return job_id
+
+    async def resume(self) -> None:
+        for job in await async_db.list_unfinished_broadcasts():
+            logger.info("Продолжаем рассылку #%s после перезапуска", job["id"])
+            self._spawn(job["id"])
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, job_id: int) -> None:
+        if job_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda done: self._on_done(job_id, done))
+
+    def _on_done(self, job_id: int, task: asyncio.Task) -> None:
+        self._tasks.pop(job_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            # Задача остается в статусе running и продолжится после перезапуска
+            logger.error("Рассылка #%s прервана: %s", job_id, task.exception())
+
+    async def _run(self, job_id: int) -> None:
+        job = await async_db.get_broadcast_job(job_id)
+        if job is None:
+            return
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        results: List[BroadcastResult] = []
+        flush_lock = asyncio.Lock()
+        last_flush = time.monotonic()
+
+        async def flush() -> None:
+            nonlocal last_flush
+            async with flush_lock:
+                batch = results[:]
+                del results[:]
+                last_flush = time.monotonic()
+                if batch:
+                    await async_db.save_broadcast_results(job_id, batch)
+
+        async def produce() -> None:
+            after = 0
+            while True:
+                chunk = await async_db.get_pending_recipients(job_id, after, self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                for user_id in chunk:
+                    await queue.put(user_id)
+                after = chunk[-1]
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def work() -> None:
+            while True:
+                user_id = await queue.get()
+                if user_id is None:
+                    return
+                results.append(await self._deliver(user_id, job["text"]))
+                if len(results) >= self.FLUSH_EVERY or time.monotonic() - last_flush >= self.FLUSH_INTERVAL:
+                    await flush()
+
+        progress = asyncio.create_task(self._report_progress(job))
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            # При ошибке или остановке не оставляем остальные отправки работать
+            for task in (*tasks, progress):
+                task.cancel()
+            await asyncio.gather(*tasks, progress, return_exceptions=True)
+            # Сохраняем итоги даже при остановке, чтобы не слать их повторно после перезапуска
+            await asyncio.shield(flush())
+        await async_db.finish_broadcast_job(job_id)
+        await self._edit_progress(job, finished=True)
+        logger.info("Рассылка #%s завершена", job_id)
+
+    async def _deliver(self, user_id: int, text: str) -> BroadcastResult:
+        error: Optional[str] = None
+        attempts = 0
+        failures = 0
+        while failures < self.max_attempts:
+            attempts += 1
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(user_id, text)
+                return user_id, "sent", attempts, None
+            except TelegramRetryAfter as exc:
+                # Лимит общий для всего бота, поэтому ставим на паузу всю отправку;
+                # это не ошибка доставки, и в max_attempts не считается
+                self.bucket.pause(exc.retry_after)
+                continue
+            except TelegramForbiddenError as exc:
+                # Пользователь заблокировал бота — повторять бессмысленно
+                return user_id, "blocked", attempts, str(exc)
+            except TelegramBadRequest as exc:
+                # Например, чат не найден: повтор не поможет
+                return user_id, "failed", attempts, str(exc)
+            except Exception as exc:
+                error = str(exc) or type(exc).__name__
+                failures += 1
+                await asyncio.sleep(min(30.0, 2 ** failures) + random.random())
+        logger.error("Не удалось отправить рассылку %s: %s", user_id, error)
+        return user_id, "failed", attempts, error
+
+    async def _report_progress(self, job) -> None:
+        while True:
+            await asyncio.sleep(self.PROGRESS_INTERVAL)
+            await self._edit_progress(job, finished=False)
+
+    async def _edit_progress(self, job, finished: bool) -> None:
+        if not job["progress_message_id"]:
+            job = await async_db.get_broadcast_job(job["id"])
+            if not job["progress_message_id"]:
+                return
+        counts = await async_db.get_broadcast_counts(job["id"])
+        try:
+            await self.bot.edit_message_text(
+                chat_id=job["admin_chat_id"],
+                message_id=job["progress_message_id"],
+                text=self._progress_text(job["id"], counts, finished),
+            )
+        except Exception as exc:
+            logger.debug("Не удалось обновить прогресс рассылки #%s: %s", job["id"], exc)
+
+    @staticmethod
+    def _progress_text(job_id: int, counts: Dict[str, int], finished: bool) -> str:
+        total = sum(counts.values())
+        sent = counts.get("sent", 0)
+        failed = counts.get("failed", 0) + counts.get("blocked", 0)
+        done = sent + failed
+        header = "✅ Рассылка завершена" if finished else "📢 Рассылка идет"
+        return (
+            f"{header} (#{job_id})\n"
+            f"Обработано: {done} из {total}\n"
+            f"Успешно: {sent}. Не доставлено: {failed}."
+        )
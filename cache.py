@@ -0,0 +1,83 @@
+"""
+Небольшой LRU-кэш с TTL и счетчиками попаданий для горячих данных бота.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    def __init__(self, maxsize: int = 128, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Растет при invalidate(); значения, посчитанные до нее, не сохраняются
+        self._generation = 0
+        # pop() метит только свой ключ: номер последнего удаления по ключу
+        self._pops = 0
+        self._popped: Dict[K, int] = {}
+        self._items: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+
+    @property
+    def stamp(self) -> Tuple[int, int]:
+        """Метка для set(): значение, прочитанное до pop(key) или invalidate(), не сохранится."""
+        return self._generation, self._pops
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, stamp: Optional[Tuple[int, int]] = None) -> None:
+        if stamp is not None:
+            generation, pops = stamp
+            if generation != self._generation or self._popped.get(key, 0) > pops:
+                return
+        expires_at = time.monotonic() + self.ttl if self.ttl else float("inf")
+        self._items[key] = (expires_at, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._pops += 1
+        self._popped[key] = self._pops
+        if len(self._popped) > self.maxsize:
+            # Метки удалений не копим: забываем их ценой одной общей инвалидации
+            self._popped.clear()
+            self._generation += 1
+        self._items.pop(key, None)
+
+    def invalidate(self, predicate: Optional[Callable[[K], bool]] = None) -> None:
+        self._generation += 1
+        self._popped.clear()
+        if predicate is None:
+            self._items.clear()
+            return
+        for key in [key for key in self._items if predicate(key)]:
+            del self._items[key]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,64 @@
+"""
+Справочник категорий активностей.
+
+Категории хранятся в таблице categories с небольшими целыми id; в
+activities и activity_daily записывается только id. Справочник читается
+из базы один раз и дальше живет в памяти: по нему строятся клавиатуры,
+подписи и статистика. Новая категория добавляется командой
+python -m bot.manage add-category и появляется после перезапуска бота.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+@dataclass(frozen=True)
+class Category:
+    id: int
+    key: str
+    label: str
+    activity_button: str
+    rating_button: str
+    position: int
+
+
+class CategoryRegistry:
+    def __init__(self) -> None:
+        self._by_key: Dict[str, Category] = {}
+        self._by_id: Dict[int, Category] = {}
+        self._ordered: List[Category] = []
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._ordered)
+
+    def load(self, rows: Iterable[Tuple[int, str, str, str, str, int]]) -> None:
+        """rows — (id, key, label, activity_button, rating_button, position)."""
+        categories = [Category(*row) for row in rows]
+        self._ordered = sorted(categories, key=lambda category: (category.position, category.id))
+        self._by_key = {category.key: category for category in categories}
+        self._by_id = {category.id: category for category in categories}
+
+    def __iter__(self) -> Iterator[Category]:
+        return iter(self._ordered)
+
+    def __len__(self) -> int:
+        return len(self._ordered)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._by_key
+
+    def keys(self) -> List[str]:
+        return [category.key for category in self._ordered]
+
+    def id_of(self, key: str) -> int:
+        category = self._by_key.get(key)
+        if category is None:
+            raise ValueError(f"Неизвестная категория: {key}")
+        return category.id
+
+    def key_of(self, category_id: int) -> str:
+        return self._by_id[category_id].key
+
+    def label(self, key: str) -> str:
+        category = self._by_key.get(key)
+        return category.label if category is not None else key
@@ -9,6 +9,47 @@ class Settings:
     admin_ids: List[int]
     admin_phones: List[str]
     database_path: str = "data/bot.db"
+    db_readers: int = 4
+    db_mmap_size: int = 256 * 1024 * 1024
+    db_cache_size_kib: int = 16 * 1024
+    activity_flush_interval_ms: int = 50
+    activity_flush_max_rows: int = 200
+    leaderboard_cache_size: int = 128
+    leaderboard_cache_ttl: float = 60.0
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 0.0
+    proxy_probe_concurrency: int = 8
+    proxy_probe_timeout: float = 15.0
+    proxy_probe_grace: float = 1.0
+    proxy_health_interval: float = 60.0
+    proxy_failure_threshold: int = 3
+    proxy_connection_limit: int = 100
+    proxy_keepalive_timeout: float = 30.0
+    send_rate_limit: float = 30.0
+    broadcast_concurrency: int = 20
+    broadcast_max_attempts: int = 5
+    outbox_concurrency: int = 5
+    outbox_max_attempts: int = 8
+    message_store_size: int = 50000
+    message_store_flush_ms: int = 1000
+    fsm_cache_size: int = 10000
+    fsm_flush_ms: int = 50
+    fsm_ttl_hours: float = 72.0
+    run_mode: str = "polling"
+    webhook_base_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_max_connections: int = 40
+    webhook_local_test: bool = False
+    workers: int = 0
+    worker_queue_size: int = 1000
+    worker_cache_ttl: float = 5.0
+    worker_drain_timeout: float = 30.0
+    update_concurrency: int = 64
+    update_max_pending: int = 1000
+    update_stats_interval: float = 60.0
 
     @classmethod
     def from_env(cls) -> "Settings":
@@ -18,11 +59,119 @@ class Settings:
         admin_phones_raw = os.getenv("ADMIN_PHONES")
         admin_phones = [value.strip() for value in admin_phones_raw.split(",") if value.strip()]
         database_path = os.getenv("DATABASE_PATH", cls.database_path)
+        db_readers = int(os.getenv("DB_READERS", cls.db_readers))
+        db_mmap_size = int(os.getenv("DB_MMAP_SIZE", cls.db_mmap_size))
+        db_cache_size_kib = int(os.getenv("DB_CACHE_SIZE_KIB", cls.db_cache_size_kib))
+        activity_flush_interval_ms = int(
+            os.getenv("ACTIVITY_FLUSH_INTERVAL_MS", cls.activity_flush_interval_ms)
+        )
+        activity_flush_max_rows = int(
+            os.getenv("ACTIVITY_FLUSH_MAX_ROWS", cls.activity_flush_max_rows)
+        )
+        leaderboard_cache_size = int(
+            os.getenv("LEADERBOARD_CACHE_SIZE", cls.leaderboard_cache_size)
+        )
+        leaderboard_cache_ttl = float(os.getenv("LEADERBOARD_CACHE_TTL", cls.leaderboard_cache_ttl))
+        user_cache_size = int(os.getenv("USER_CACHE_SIZE", cls.user_cache_size))
+        user_cache_ttl = float(os.getenv("USER_CACHE_TTL", cls.user_cache_ttl))
+        proxy_probe_concurrency = int(
+            os.getenv("PROXY_PROBE_CONCURRENCY", cls.proxy_probe_concurrency)
+        )
+        proxy_probe_timeout = float(os.getenv("PROXY_PROBE_TIMEOUT", cls.proxy_probe_timeout))
+        proxy_probe_grace = float(os.getenv("PROXY_PROBE_GRACE", cls.proxy_probe_grace))
+        proxy_health_interval = float(
+            os.getenv("PROXY_HEALTH_INTERVAL", cls.proxy_health_interval)
+        )
+        proxy_failure_threshold = int(
+            os.getenv("PROXY_FAILURE_THRESHOLD", cls.proxy_failure_threshold)
+        )
+        proxy_connection_limit = int(
+            os.getenv("PROXY_CONNECTION_LIMIT", cls.proxy_connection_limit)
+        )
+        proxy_keepalive_timeout = float(
+            os.getenv("PROXY_KEEPALIVE_TIMEOUT", cls.proxy_keepalive_timeout)
+        )
+        send_rate_limit = float(os.getenv("SEND_RATE_LIMIT", cls.send_rate_limit))
+        broadcast_concurrency = int(os.getenv("BROADCAST_CONCURRENCY", cls.broadcast_concurrency))
+        broadcast_max_attempts = int(
+            os.getenv("BROADCAST_MAX_ATTEMPTS", cls.broadcast_max_attempts)
+        )
+        outbox_concurrency = int(os.getenv("OUTBOX_CONCURRENCY", cls.outbox_concurrency))
+        outbox_max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", cls.outbox_max_attempts))
+        message_store_size = int(os.getenv("MESSAGE_STORE_SIZE", cls.message_store_size))
+        message_store_flush_ms = int(
+            os.getenv("MESSAGE_STORE_FLUSH_MS", cls.message_store_flush_ms)
+        )
+        fsm_cache_size = int(os.getenv("FSM_CACHE_SIZE", cls.fsm_cache_size))
+        fsm_flush_ms = int(os.getenv("FSM_FLUSH_MS", cls.fsm_flush_ms))
+        fsm_ttl_hours = float(os.getenv("FSM_TTL_HOURS", cls.fsm_ttl_hours))
+        run_mode = os.getenv("RUN_MODE", cls.run_mode).strip().lower()
+        webhook_base_url = os.getenv("WEBHOOK_BASE_URL", cls.webhook_base_url)
+        webhook_path = os.getenv("WEBHOOK_PATH", cls.webhook_path)
+        webhook_secret = os.getenv("WEBHOOK_SECRET", cls.webhook_secret)
+        webhook_host = os.getenv("WEBHOOK_HOST", cls.webhook_host)
+        webhook_port = int(os.getenv("WEBHOOK_PORT", cls.webhook_port))
+        webhook_max_connections = int(
+            os.getenv("WEBHOOK_MAX_CONNECTIONS", cls.webhook_max_connections)
+        )
+        webhook_local_test = os.getenv("WEBHOOK_LOCAL_TEST", "").strip().lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        workers = int(os.getenv("WORKERS", cls.workers))
+        worker_queue_size = int(os.getenv("WORKER_QUEUE_SIZE", cls.worker_queue_size))
+        worker_cache_ttl = float(os.getenv("WORKER_CACHE_TTL", cls.worker_cache_ttl))
+        worker_drain_timeout = float(os.getenv("WORKER_DRAIN_TIMEOUT", cls.worker_drain_timeout))
+        update_concurrency = int(os.getenv("UPDATE_CONCURRENCY", cls.update_concurrency))
+        update_max_pending = int(os.getenv("UPDATE_MAX_PENDING", cls.update_max_pending))
+        update_stats_interval = float(os.getenv("UPDATE_STATS_INTERVAL", cls.update_stats_interval))
         return cls(
             bot_token=token,
             admin_ids=admin_ids,
             admin_phones=admin_phones,
             database_path=database_path,
+            db_readers=db_readers,
+            db_mmap_size=db_mmap_size,
+            db_cache_size_kib=db_cache_size_kib,
+            activity_flush_interval_ms=activity_flush_interval_ms,
+            activity_flush_max_rows=activity_flush_max_rows,
+            leaderboard_cache_size=leaderboard_cache_size,
+            leaderboard_cache_ttl=leaderboard_cache_ttl,
+            user_cache_size=user_cache_size,
+            user_cache_ttl=user_cache_ttl,
+            proxy_probe_concurrency=proxy_probe_concurrency,
+            proxy_probe_timeout=proxy_probe_timeout,
+            proxy_probe_grace=proxy_probe_grace,
+            proxy_health_interval=proxy_health_interval,
+            proxy_failure_threshold=proxy_failure_threshold,
+            proxy_connection_limit=proxy_connection_limit,
+            proxy_keepalive_timeout=proxy_keepalive_timeout,
+            send_rate_limit=send_rate_limit,
+            broadcast_concurrency=broadcast_concurrency,
+            broadcast_max_attempts=broadcast_max_attempts,
+            outbox_concurrency=outbox_concurrency,
+            outbox_max_attempts=outbox_max_attempts,
+            message_store_size=message_store_size,
+            message_store_flush_ms=message_store_flush_ms,
+            fsm_cache_size=fsm_cache_size,
+            fsm_flush_ms=fsm_flush_ms,
+            fsm_ttl_hours=fsm_ttl_hours,
+            run_mode=run_mode,
+            webhook_base_url=webhook_base_url,
+            webhook_path=webhook_path,
+            webhook_secret=webhook_secret,
+            webhook_host=webhook_host,
+            webhook_port=webhook_port,
+            webhook_max_connections=webhook_max_connections,
+            webhook_local_test=webhook_local_test,
+            workers=workers,
+            worker_queue_size=worker_queue_size,
+            worker_cache_ttl=worker_cache_ttl,
+            worker_drain_timeout=worker_drain_timeout,
+            update_concurrency=update_concurrency,
+            update_max_pending=update_max_pending,
+            update_stats_interval=update_stats_interval,
         )
 
 
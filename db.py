@@ -1,57 +1,198 @@
 
+import calendar
 import sqlite3
-from contextlib import contextmanager
-from datetime import datetime, timedelta
-from typing import Iterable, List, Optional, Sequence, Tuple
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
+from bot.admins import normalize_phone
+from bot.categories import CategoryRegistry
 from bot.config import settings
+from bot.migrations import create_schema, migrate
+from bot.storage import Storage
+
+
+storage = Storage(
+    settings.database_path,
+    readers=settings.db_readers,
+    mmap_size=settings.db_mmap_size,
+    cache_size_kib=settings.db_cache_size_kib,
+)
 
 
-@contextmanager
 def get_connection():
-    database_path = settings.database_path
-    conn = sqlite3.connect(database_path)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-        conn.commit()
-    finally:
-        conn.close()
+    return storage.write()
+
+
+def get_read_connection():
+    return storage.read()
+
+
+def close_connections() -> None:
+    storage.close()
+
+
+def to_epoch(moment: datetime) -> int:
+    """Секунды Unix для наивного datetime в UTC — формат столбцов created_at."""
+    return calendar.timegm(moment.utctimetuple())
+
+
+def epoch_day(timestamp: int) -> str:
+    """День (YYYY-MM-DD, UTC) для сводки activity_daily."""
+    return datetime.utcfromtimestamp(timestamp).date().isoformat()
+
+
+# Справочник категорий; init_db и load_categories заполняют его из таблицы categories
+categories = CategoryRegistry()
+_CATEGORY_QUERY = "SELECT id, key, label, activity_button, rating_button, position FROM categories"
+
+
+def load_categories() -> CategoryRegistry:
+    with get_read_connection() as conn:
+        categories.load(conn.execute(_CATEGORY_QUERY).fetchall())
+    return categories
+
+
+def _category_id(key: str) -> int:
+    if not categories.loaded:
+        load_categories()
+    return categories.id_of(key)
+
+
+def add_category(key: str, label: str, activity_button: str, rating_button: str) -> int:
+    """Добавляет категорию в конец списка и возвращает ее id."""
+    with get_connection() as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO categories (key, label, activity_button, rating_button, position)
+            SELECT ?, ?, ?, ?, COALESCE(MAX(position), 0) + 1 FROM categories
+            """,
+            (key, label, activity_button, rating_button),
+        )
+        return cursor.lastrowid
 
 
 def init_db() -> None:
     with get_connection() as conn:
+        # Новая база сразу создается в текущей схеме; существующую доводят шаги bot.migrations
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'").fetchone() is None:
+            create_schema(conn)
         conn.execute(
             """
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                full_name TEXT NOT NULL,
-                phone TEXT NOT NULL,
-                city TEXT NOT NULL,
-                age INTEGER NOT NULL,
-                status TEXT NOT NULL DEFAULT 'pending',
-                created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                last_activity_at TEXT
+            CREATE TABLE IF NOT EXISTS bot_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at TEXT NOT NULL DEFAULT (datetime('now'))
             )
             """
         )
         conn.execute(
             """
-            CREATE TABLE IF NOT EXISTS activities (
+            CREATE TABLE IF NOT EXISTS broadcast_jobs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                category TEXT NOT NULL,
-                value REAL NOT NULL,
+                admin_chat_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                progress_message_id INTEGER,
                 created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
+                finished_at TEXT
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS broadcast_recipients (
+                job_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                PRIMARY KEY (job_id, user_id),
+                FOREIGN KEY (job_id) REFERENCES broadcast_jobs(id)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_status ON broadcast_recipients (job_id, status, user_id)
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS notification_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                dedup_key TEXT,
+                chat_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                reply_markup TEXT,
+                compact INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_notification_outbox_due ON notification_outbox (status, next_attempt_at)
+            """
+        )
+        conn.execute(
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_notification_outbox_dedup ON notification_outbox (dedup_key)
+            WHERE status = 'pending'
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS last_messages (
+                chat_id INTEGER PRIMARY KEY,
+                message_id INTEGER NOT NULL
             )
             """
         )
         conn.execute(
             """
-            CREATE INDEX IF NOT EXISTS idx_activities_user_category ON activities (user_id, category, created_at)
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL DEFAULT '{}',
+                updated_at REAL NOT NULL
+            )
             """
         )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states (updated_at)
+            """
+        )
+        migrate(conn)
+        categories.load(conn.execute(_CATEGORY_QUERY).fetchall())
+        rollup_empty = conn.execute("SELECT 1 FROM activity_daily LIMIT 1").fetchone() is None
+        history_exists = conn.execute("SELECT 1 FROM activities LIMIT 1").fetchone() is not None
+        if rollup_empty and history_exists:
+            _rebuild_daily_rollup(conn)
+
+
+def _rebuild_daily_rollup(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM activity_daily")
+    conn.execute(
+        """
+        INSERT INTO activity_daily (user_id, category_id, day, total)
+        SELECT user_id, category_id, date(created_at, 'unixepoch'), SUM(value)
+        FROM activities
+        GROUP BY user_id, category_id, date(created_at, 'unixepoch')
+        """
+    )
+
+
+def backfill_daily_rollup() -> int:
+    """Пересчитывает дневную сводку activity_daily по всей истории активностей."""
+    with get_connection() as conn:
+        _rebuild_daily_rollup(conn)
+        return conn.execute("SELECT COUNT(*) FROM activity_daily").fetchone()[0]
 
 
 def add_user(user_id: int, full_name: str, phone: str, city: str, age: int) -> None:
@@ -72,34 +213,87 @@ def add_user(user_id: int, full_name: str, phone: str, city: str, age: int) -> N
 
 
 def get_user(user_id: int) -> Optional[sqlite3.Row]:
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
         return cursor.fetchone()
 
 
+def get_recent_users(limit: int) -> List[sqlite3.Row]:
+    with get_read_connection() as conn:
+        cursor = conn.execute(
+            """
+            SELECT * FROM users
+            ORDER BY last_activity_at IS NULL, last_activity_at DESC, created_at DESC
+            LIMIT ?
+            """,
+            (limit,),
+        )
+        return cursor.fetchall()
+
+
+def get_user_ids_by_phones(phones: Iterable[str]) -> List[int]:
+    """user_id пользователей, чей нормализованный телефон входит в phones."""
+    normalized = list({normalize_phone(phone) for phone in phones} - {""})
+    if not normalized:
+        return []
+    placeholders = ",".join(["?"] * len(normalized))
+    with get_read_connection() as conn:
+        conn.create_function("normalize_phone", 1, normalize_phone, deterministic=True)
+        cursor = conn.execute(
+            f"SELECT user_id FROM users WHERE normalize_phone(phone) IN ({placeholders})",
+            normalized,
+        )
+        return [row["user_id"] for row in cursor]
+
+
 def set_user_status(user_id: int, status: str) -> None:
     with get_connection() as conn:
         conn.execute("UPDATE users SET status = ? WHERE user_id = ?", (status, user_id))
 
 
 def add_activity(user_id: int, category: str, value: float) -> None:
-    now = datetime.utcnow().isoformat()
+    add_activities([(user_id, category, value, int(time.time()))])
+
+
+def add_activities(rows: Sequence[Tuple[int, str, float, int]]) -> None:
+    """
+    Записывает пачку активностей (user_id, category, value, created_at) одной
+    транзакцией. created_at — секунды Unix (UTC).
+    """
+    last_activity: Dict[int, int] = {}
+    daily: Dict[Tuple[int, int, str], float] = {}
+    stored = []
+    for user_id, category, value, created_at in rows:
+        category_id = _category_id(category)
+        stored.append((user_id, category_id, value, created_at))
+        if created_at > last_activity.get(user_id, -1):
+            last_activity[user_id] = created_at
+        key = (user_id, category_id, epoch_day(created_at))
+        daily[key] = daily.get(key, 0.0) + value
     with get_connection() as conn:
-        conn.execute(
+        conn.executemany(
             """
-            INSERT INTO activities (user_id, category, value, created_at)
+            INSERT INTO activities (user_id, category_id, value, created_at)
             VALUES (?, ?, ?, ?)
             """,
-            (user_id, category, value, now),
+            stored,
         )
-        conn.execute(
+        conn.executemany(
             "UPDATE users SET last_activity_at = ? WHERE user_id = ?",
-            (now, user_id),
+            [(created_at, user_id) for user_id, created_at in last_activity.items()],
+        )
+        conn.executemany(
+            """
+            INSERT INTO activity_daily (user_id, category_id, day, total)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id, category_id, day) DO UPDATE SET total = total + excluded.total
+            """,
+            [(user_id, category_id, day, total) for (user_id, category_id, day), total in daily.items()],
         )
 
 
 def list_pending_users() -> List[sqlite3.Row]:
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.execute(
             "SELECT * FROM users WHERE status = 'pending' ORDER BY created_at ASC"
         )
@@ -109,88 +303,198 @@ def list_pending_users() -> List[sqlite3.Row]:
 def list_users_by_status(statuses: Sequence[str]) -> List[sqlite3.Row]:
     placeholders = ",".join(["?"] * len(statuses))
     query = f"SELECT * FROM users WHERE status IN ({placeholders}) ORDER BY created_at DESC"
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.execute(query, tuple(statuses))
         return cursor.fetchall()
 
 
+UserCursor = Tuple[int, int]
+
+
+def list_users_page(
+    statuses: Sequence[str],
+    limit: int,
+    after: Optional[UserCursor] = None,
+    before: Optional[UserCursor] = None,
+) -> Tuple[List[sqlite3.Row], bool, bool]:
+    """
+    Страница пользователей от новых к старым по ключу (created_at, user_id).
+
+    after — курсор последней строки текущей страницы (следующая страница),
+    before — первой (предыдущая). Каждый статус читается отдельным
+    диапазоном индекса idx_users_status_created, поэтому стоимость не
+    зависит от размера таблицы. Возвращает (строки, есть_предыдущая, есть_следующая).
+    """
+    backward = before is not None
+    cursor_value = before if backward else after
+    condition = ""
+    if cursor_value is not None:
+        condition = "AND (created_at, user_id) > (?, ?)" if backward else "AND (created_at, user_id) < (?, ?)"
+    order = "ASC" if backward else "DESC"
+    query = f"""
+        SELECT * FROM users
+        WHERE status = ? {condition}
+        ORDER BY created_at {order}, user_id {order}
+        LIMIT ?
+    """
+    rows: List[sqlite3.Row] = []
+    with get_read_connection() as conn:
+        for status in statuses:
+            params = [status, *(cursor_value or ()), limit + 1]
+            rows.extend(conn.execute(query, params).fetchall())
+    rows.sort(key=lambda row: (row["created_at"], row["user_id"]), reverse=not backward)
+    more = len(rows) > limit
+    page = rows[:limit]
+    if backward:
+        page.reverse()
+        return page, more, True
+    return page, cursor_value is not None, more
+
+
+def _totals_source(
+    category: str, since: Optional[datetime], user_id: Optional[int] = None
+) -> Tuple[str, List[object]]:
+    """
+    Подзапрос (user_id, total) за период из сводки activity_daily. Периоды
+    из format_period начинаются в полночь, поэтому since берется с точностью
+    до дня.
+    """
+    user_filter = " AND user_id = ?" if user_id is not None else ""
+    user_params: List[object] = [user_id] if user_id is not None else []
+    category_id = _category_id(category)
+    if since is None:
+        return (
+            f"SELECT user_id, total FROM activity_daily WHERE category_id = ?{user_filter}",
+            [category_id, *user_params],
+        )
+    return (
+        f"SELECT user_id, total FROM activity_daily WHERE category_id = ? AND day >= ?{user_filter}",
+        [category_id, since.date().isoformat(), *user_params],
+    )
+
+
 def get_leaderboard(category: str, since: Optional[datetime]) -> List[sqlite3.Row]:
-    with get_connection() as conn:
-        if since:
-            cursor = conn.execute(
-                """
-                SELECT u.full_name, u.city, SUM(a.value) as total
-                FROM activities a
-                JOIN users u ON u.user_id = a.user_id
-                WHERE a.category = ? AND a.created_at >= ? AND u.status = 'approved'
-                GROUP BY a.user_id
-                ORDER BY total DESC
-                LIMIT 10
-                """,
-                (category, since.isoformat()),
-            )
-        else:
-            cursor = conn.execute(
-                """
-                SELECT u.full_name, u.city, SUM(a.value) as total
-                FROM activities a
-                JOIN users u ON u.user_id = a.user_id
-                WHERE a.category = ? AND u.status = 'approved'
-                GROUP BY a.user_id
-                ORDER BY total DESC
-                LIMIT 10
-                """,
-                (category,),
-            )
+    source, params = _totals_source(category, since)
+    with get_read_connection() as conn:
+        cursor = conn.execute(
+            f"""
+            SELECT u.full_name, u.city, SUM(t.total) as total
+            FROM ({source}) t
+            JOIN users u ON u.user_id = t.user_id
+            WHERE u.status = 'approved'
+            GROUP BY t.user_id
+            ORDER BY total DESC
+            LIMIT 10
+            """,
+            params,
+        )
         return cursor.fetchall()
 
 
 def get_personal_stats(user_id: int, category: str, since: Optional[datetime]) -> float:
-    with get_connection() as conn:
-        if since:
-            cursor = conn.execute(
-                """
-                SELECT SUM(value) as total
-                FROM activities
-                WHERE user_id = ? AND category = ? AND created_at >= ?
-                """,
-                (user_id, category, since.isoformat()),
-            )
-        else:
+    source, params = _totals_source(category, since, user_id)
+    with get_read_connection() as conn:
+        cursor = conn.execute(f"SELECT SUM(total) as total FROM ({source})", params)
+        row = cursor.fetchone()
+        return float(row["total"]) if row and row["total"] is not None else 0.0
+
+
+def get_leaderboard_snapshot(
+    since_day: date,
+) -> Tuple[List[sqlite3.Row], List[sqlite3.Row], List[sqlite3.Row]]:
+    """Данные для загрузки рейтингов в память: пользователи, сводка с since_day и суммы за все время."""
+    with get_read_connection() as conn:
+        users = conn.execute("SELECT user_id, full_name, city, status FROM users").fetchall()
+        daily = conn.execute(
+            "SELECT user_id, category_id, day, total FROM activity_daily WHERE day >= ?",
+            (since_day.isoformat(),),
+        ).fetchall()
+        all_time = conn.execute(
+            """
+            SELECT user_id, category_id, SUM(total) AS total
+            FROM activity_daily
+            GROUP BY user_id, category_id
+            """
+        ).fetchall()
+    if not categories.loaded:
+        load_categories()
+    key_of = categories.key_of
+    return (
+        users,
+        [(user_id, key_of(category_id), day, total) for user_id, category_id, day, total in daily],
+        [(user_id, key_of(category_id), total) for user_id, category_id, total in all_time],
+    )
+
+
+# Ограничение на число параметров в одном запросе SQLite
+_MAX_BATCH = 500
+
+
+def get_stats_matrix(
+    user_ids: Sequence[int], category_keys: Sequence[str], periods: Sequence[str]
+) -> Dict[Tuple[int, str, str], float]:
+    """
+    Суммы по всем сочетаниям (user_id, category, period) за один проход по
+    сводке activity_daily с условной агрегацией. Периоды — ключи format_period.
+    Отсутствующие сочетания возвращаются как 0.0.
+    """
+    matrix = {
+        (user_id, category, period): 0.0
+        for user_id in user_ids
+        for category in category_keys
+        for period in periods
+    }
+    if not matrix:
+        return matrix
+    starts = [format_period(period) for period in periods]
+    columns = ",\n".join(
+        f"SUM(CASE WHEN day >= ? THEN total ELSE 0 END) AS p{index}"
+        if since is not None
+        else f"SUM(total) AS p{index}"
+        for index, since in enumerate(starts)
+    )
+    column_params = [since.date().isoformat() for since in starts if since is not None]
+    day_filter = ""
+    day_params: List[object] = []
+    if all(since is not None for since in starts):
+        day_filter = " AND day >= ?"
+        day_params = [min(starts).date().isoformat()]
+    category_ids = {_category_id(category): category for category in category_keys}
+    category_placeholders = ",".join(["?"] * len(category_ids))
+    unique_ids = list(dict.fromkeys(user_ids))
+    with get_read_connection() as conn:
+        for offset in range(0, len(unique_ids), _MAX_BATCH):
+            chunk = unique_ids[offset : offset + _MAX_BATCH]
+            user_placeholders = ",".join(["?"] * len(chunk))
             cursor = conn.execute(
-                """
-                SELECT SUM(value) as total
-                FROM activities
-                WHERE user_id = ? AND category = ?
+                f"""
+                SELECT user_id, category_id,
+                {columns}
+                FROM activity_daily
+                WHERE user_id IN ({user_placeholders})
+                  AND category_id IN ({category_placeholders}){day_filter}
+                GROUP BY user_id, category_id
                 """,
-                (user_id, category),
+                [*column_params, *chunk, *category_ids, *day_params],
             )
-        row = cursor.fetchone()
-        return float(row["total"]) if row and row["total"] is not None else 0.0
+            for row in cursor:
+                category = category_ids[row["category_id"]]
+                for index, period in enumerate(periods):
+                    matrix[(row["user_id"], category, period)] = float(row[f"p{index}"] or 0.0)
+    return matrix
 
 
 def get_personal_all_stats(user_id: int) -> List[Tuple[str, str, float]]:
-    categories = [
-        "pushups",
-        "squats",
-        "pullups",
-        "running",
-        "reading",
+    if not categories.loaded:
+        load_categories()
+    category_keys = categories.keys()
+    periods = ["day", "week", "month"]
+    matrix = get_stats_matrix([user_id], category_keys, periods)
+    return [
+        (category, period, matrix[(user_id, category, period)])
+        for period in periods
+        for category in category_keys
     ]
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    week = today - timedelta(days=7)
-    month = today - timedelta(days=30)
-
-    stats: List[Tuple[str, str, float]] = []
-    for period_key, period_name, since in (
-        ("day", "За 1 день", today),
-        ("week", "За неделю", week),
-        ("month", "За месяц", month),
-    ):
-        for category in categories:
-            total = get_personal_stats(user_id, category, since)
-            stats.append((category, period_key, total))
-    return stats
 
 
 def format_period(period: str) -> Optional[datetime]:
@@ -211,15 +515,325 @@ def format_period(period: str) -> Optional[datetime]:
 
 
 def get_profile(user_id: int) -> Optional[sqlite3.Row]:
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
         return cursor.fetchone()
 
 
+USER_SCAN_CHUNK = 500
+
+
+def get_users_chunk(
+    statuses: Sequence[str], after_user_id: Optional[int], limit: int, columns: Sequence[str] = ("user_id",)
+) -> List[sqlite3.Row]:
+    """
+    Следующие limit пользователей после after_user_id в порядке user_id.
+    Каждый статус читается отдельным диапазоном индекса idx_users_status_user
+    без сортировки во временном B-дереве, порции сливаются здесь.
+    """
+    if "user_id" not in columns:
+        columns = ("user_id", *columns)
+    condition = "" if after_user_id is None else "AND user_id > ?"
+    query = f"""
+        SELECT {", ".join(columns)} FROM users
+        WHERE status = ? {condition}
+        ORDER BY user_id
+        LIMIT ?
+    """
+    rows: List[sqlite3.Row] = []
+    with get_read_connection() as conn:
+        for status in statuses:
+            params = [status, *(() if after_user_id is None else (after_user_id,)), limit]
+            rows.extend(conn.execute(query, params).fetchall())
+    rows.sort(key=lambda row: row["user_id"])
+    return rows[:limit]
+
+
+def iter_users(
+    statuses: Sequence[str], chunk_size: int = USER_SCAN_CHUNK, columns: Sequence[str] = ("user_id",)
+) -> Iterator[sqlite3.Row]:
+    """
+    Проходит по пользователям порциями по ключу user_id. Соединение занято
+    только на время чтения порции, а не пока вызывающий обрабатывает строки,
+    и память не растет с числом пользователей.
+    """
+    after: Optional[int] = None
+    while True:
+        chunk = get_users_chunk(statuses, after, chunk_size, columns)
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1]["user_id"]
+
+
 def get_registered_users(statuses: Sequence[str]) -> Iterable[int]:
+    for row in iter_users(statuses):
+        yield row["user_id"]
+
+
+def get_bot_state(key: str) -> Optional[str]:
+    with get_read_connection() as conn:
+        row = conn.execute("SELECT value FROM bot_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+
+def set_bot_state(key: str, value: str) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO bot_state (key, value, updated_at) VALUES (?, ?, datetime('now'))
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            """,
+            (key, value),
+        )
+
+
+def create_broadcast_job(admin_chat_id: int, text: str, statuses: Sequence[str]) -> int:
+    """Создает задачу рассылки и список получателей одним запросом INSERT ... SELECT."""
     placeholders = ",".join(["?"] * len(statuses))
-    query = f"SELECT user_id FROM users WHERE status IN ({placeholders})"
     with get_connection() as conn:
-        cursor = conn.execute(query, tuple(statuses))
-        for row in cursor.fetchall():
-            yield row["user_id"]
\ No newline at end of file
+        cursor = conn.execute(
+            "INSERT INTO broadcast_jobs (admin_chat_id, text) VALUES (?, ?)",
+            (admin_chat_id, text),
+        )
+        job_id = cursor.lastrowid
+        conn.execute(
+            f"""
+            INSERT INTO broadcast_recipients (job_id, user_id)
+            SELECT ?, user_id FROM users WHERE status IN ({placeholders})
+            """,
+            (job_id, *statuses),
+        )
+        return job_id
+
+
+def set_broadcast_progress_message(job_id: int, message_id: int) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            "UPDATE broadcast_jobs SET progress_message_id = ? WHERE id = ?",
+            (message_id, job_id),
+        )
+
+
+def list_unfinished_broadcasts() -> List[sqlite3.Row]:
+    with get_read_connection() as conn:
+        cursor = conn.execute("SELECT * FROM broadcast_jobs WHERE status = 'running' ORDER BY id")
+        return cursor.fetchall()
+
+
+def get_broadcast_job(job_id: int) -> Optional[sqlite3.Row]:
+    with get_read_connection() as conn:
+        return conn.execute("SELECT * FROM broadcast_jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def get_pending_recipients(job_id: int, after_user_id: int, limit: int) -> List[int]:
+    with get_read_connection() as conn:
+        cursor = conn.execute(
+            """
+            SELECT user_id FROM broadcast_recipients
+            WHERE job_id = ? AND status = 'pending' AND user_id > ?
+            ORDER BY user_id
+            LIMIT ?
+            """,
+            (job_id, after_user_id, limit),
+        )
+        return [row["user_id"] for row in cursor]
+
+
+def save_broadcast_results(job_id: int, results: Sequence[Tuple[int, str, int, Optional[str]]]) -> None:
+    """Сохраняет пачку итогов (user_id, status, attempts, error) одной транзакцией."""
+    with get_connection() as conn:
+        conn.executemany(
+            """
+            UPDATE broadcast_recipients SET status = ?, attempts = ?, error = ?
+            WHERE job_id = ? AND user_id = ?
+            """,
+            [(status, attempts, error, job_id, user_id) for user_id, status, attempts, error in results],
+        )
+
+
+def get_broadcast_counts(job_id: int) -> Dict[str, int]:
+    with get_read_connection() as conn:
+        cursor = conn.execute(
+            "SELECT status, COUNT(*) AS total FROM broadcast_recipients WHERE job_id = ? GROUP BY status",
+            (job_id,),
+        )
+        return {row["status"]: row["total"] for row in cursor}
+
+
+def finish_broadcast_job(job_id: int, status: str = "done") -> None:
+    with get_connection() as conn:
+        conn.execute(
+            "UPDATE broadcast_jobs SET status = ?, finished_at = datetime('now') WHERE id = ?",
+            (status, job_id),
+        )
+
+
+def enqueue_notification(
+    chat_id: int,
+    text: str,
+    reply_markup: Optional[str],
+    compact: bool,
+    dedup_key: Optional[str],
+    not_before: float,
+) -> None:
+    """
+    Ставит уведомление в очередь. Если с тем же dedup_key уже ждет отправки
+    другое уведомление, оно заменяется новым, а не дублируется.
+    """
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO notification_outbox (dedup_key, chat_id, text, reply_markup, compact, next_attempt_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(dedup_key) WHERE status = 'pending' DO UPDATE SET
+                chat_id = excluded.chat_id,
+                text = excluded.text,
+                reply_markup = excluded.reply_markup,
+                compact = excluded.compact
+            """,
+            (dedup_key, chat_id, text, reply_markup, int(compact), not_before),
+        )
+
+
+# Шард чата как в Python (chat_id % shards >= 0 и для отрицательных id групп)
+_NOTIFICATION_SHARD = "((chat_id % :shards) + :shards) % :shards = :shard"
+
+
+def claim_notifications(now: float, limit: int, shard: int = 0, shards: int = 1) -> List[sqlite3.Row]:
+    """
+    Забирает готовые к отправке уведомления, переводя их в status='sending'.
+    Уникальный индекс по dedup_key покрывает только 'pending', поэтому новое
+    уведомление с тем же ключом не перепишет уже отправляемое, а встанет в
+    очередь отдельной строкой. Берутся только чаты шарда shard из shards.
+    """
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT * FROM notification_outbox
+            WHERE status = 'pending' AND next_attempt_at <= :now AND {_NOTIFICATION_SHARD}
+            ORDER BY next_attempt_at, id
+            LIMIT :limit
+            """,
+            {"now": now, "limit": limit, "shard": shard, "shards": shards},
+        ).fetchall()
+        conn.executemany(
+            "UPDATE notification_outbox SET status = 'sending' WHERE id = ?",
+            [(row["id"],) for row in rows],
+        )
+        return rows
+
+
+# Отправляемое уведомление, у которого уже есть более новое с тем же dedup_key
+_SUPERSEDED = """
+    UPDATE notification_outbox SET status = 'superseded'
+    WHERE id = ? AND dedup_key IS NOT NULL AND EXISTS (
+        SELECT 1 FROM notification_outbox newer
+        WHERE newer.dedup_key = notification_outbox.dedup_key
+          AND newer.status = 'pending' AND newer.id != notification_outbox.id
+    )
+"""
+
+
+def release_claimed_notifications(shard: int = 0, shards: int = 1) -> int:
+    """Возвращает в очередь уведомления шарда, оставшиеся в 'sending' после остановки."""
+    params = {"shard": shard, "shards": shards}
+    with get_connection() as conn:
+        claimed = [
+            (row["id"],)
+            for row in conn.execute(
+                f"SELECT id FROM notification_outbox WHERE status = 'sending' AND {_NOTIFICATION_SHARD}",
+                params,
+            )
+        ]
+        conn.executemany(_SUPERSEDED, claimed)
+        conn.executemany(
+            "UPDATE notification_outbox SET status = 'pending' WHERE id = ? AND status = 'sending'", claimed
+        )
+        return len(claimed)
+
+
+def get_next_notification_time(shard: int = 0, shards: int = 1) -> Optional[float]:
+    with get_read_connection() as conn:
+        row = conn.execute(
+            f"""
+            SELECT MIN(next_attempt_at) AS next_at FROM notification_outbox
+            WHERE status = 'pending' AND {_NOTIFICATION_SHARD}
+            """,
+            {"shard": shard, "shards": shards},
+        ).fetchone()
+        return row["next_at"] if row else None
+
+
+def complete_notifications(results: Sequence[Tuple[int, str, int, float, Optional[str]]]) -> None:
+    """
+    Сохраняет итоги (id, status, attempts, next_attempt_at, last_error) одной
+    транзакцией. Повтор не нужен, если пока шла отправка, с тем же dedup_key
+    поставили новое уведомление: оно заменяет старое.
+    """
+    with get_connection() as conn:
+        conn.executemany(
+            _SUPERSEDED,
+            [(notification_id,) for notification_id, status, *_ in results if status == "pending"],
+        )
+        conn.executemany(
+            """
+            UPDATE notification_outbox
+            SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+            WHERE id = ? AND status = 'sending'
+            """,
+            [
+                (status, attempts, next_attempt_at, error, notification_id)
+                for notification_id, status, attempts, next_attempt_at, error in results
+            ],
+        )
+
+
+def get_last_message_id(chat_id: int) -> Optional[int]:
+    with get_read_connection() as conn:
+        row = conn.execute(
+            "SELECT message_id FROM last_messages WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        return row["message_id"] if row else None
+
+
+def save_last_message_ids(rows: Sequence[Tuple[int, int]]) -> None:
+    """Сохраняет пачку пар (chat_id, message_id) одной транзакцией."""
+    with get_connection() as conn:
+        conn.executemany(
+            """
+            INSERT INTO last_messages (chat_id, message_id) VALUES (?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET message_id = excluded.message_id
+            """,
+            rows,
+        )
+
+
+def get_fsm_record(key: str) -> Optional[sqlite3.Row]:
+    with get_read_connection() as conn:
+        return conn.execute(
+            "SELECT state, data, updated_at FROM fsm_states WHERE key = ?", (key,)
+        ).fetchone()
+
+
+def save_fsm_records(
+    upserts: Sequence[Tuple[str, Optional[str], str, float]], deletes: Sequence[str]
+) -> None:
+    """Сохраняет пачку состояний (key, state, data, updated_at) и удаляет пустые одной транзакцией."""
+    with get_connection() as conn:
+        conn.executemany(
+            """
+            INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                state = excluded.state,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+            """,
+            upserts,
+        )
+        conn.executemany("DELETE FROM fsm_states WHERE key = ?", [(key,) for key in deletes])
+
+
+def delete_expired_fsm_records(before: float) -> int:
+    with get_connection() as conn:
+        return conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (before,)).rowcount
@@ -0,0 +1,51 @@
+"""
+Поддельный Bot API для локальных прогонов без Telegram.
+
+FakeTelegramSession отвечает на вызовы бота сама: send_message и
+edit_message_text возвращают правдоподобное Message, get_me — бота, все
+остальное (delete_message, answer_callback_query, ...) — True. Вызовы
+считаются по методам. Используется в WEBHOOK_LOCAL_TEST и в
+bot.benchmarks.handler_bench.
+"""
+import asyncio
+import itertools
+from collections import Counter
+from datetime import datetime
+from typing import Any, AsyncGenerator, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, GetMe, SendMessage, TelegramMethod
+from aiogram.types import Chat, Message, User
+
+
+class FakeTelegramSession(BaseSession):
+    """Отвечает на вызовы Bot API локально (с задержкой latency секунд) и считает их."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, (SendMessage, EditMessageText)):
+            message_id = method.message_id if isinstance(method, EditMessageText) else next(self._message_ids)
+            return Message(
+                message_id=message_id,
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=method.text,
+            )
+        if isinstance(method, GetMe):
+            return User(id=bot.id, is_bot=True, first_name="Local test", username="local_test_bot")
+        return True
+
+    async def stream_content(self, *args: Any, **kwargs: Any) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,169 @@
+"""
+Хранилище FSM aiogram поверх SQLite бота.
+
+Горячие состояния лежат в памяти (ограниченный LRU). Несколько вызовов
+set_state/set_data/update_data одного обработчика склеиваются в одну
+запись, которая уходит в таблицу fsm_states через flush_interval.
+Брошенные состояния старше ttl удаляются фоновой очисткой, поэтому
+память не растет, а начатые сценарии переживают перезапуск.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from bot import async_db
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: float = 0.0
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+def make_key(key: StorageKey) -> str:
+    parts = [
+        key.bot_id,
+        key.chat_id,
+        key.user_id,
+        key.thread_id or "",
+        getattr(key, "business_connection_id", None) or "",
+        key.destiny,
+    ]
+    return ":".join(str(part) for part in parts)
+
+
+class SQLiteStorage(BaseStorage):
+    CLEANUP_INTERVAL = 3600.0
+
+    def __init__(self, maxsize: int = 10000, flush_interval: float = 0.05, ttl: float = 72 * 3600) -> None:
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self._records: "OrderedDict[str, _Record]" = OrderedDict()
+        self._dirty: Dict[str, _Record] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._cleanup_task: Optional[asyncio.Task] = None
+
+    async def _load(self, storage_key: StorageKey) -> _Record:
+        key = make_key(storage_key)
+        record = self._dirty.get(key) or self._records.get(key)
+        if record is None:
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                record = self._dirty.get(key) or self._records.get(key)
+                if record is None:
+                    row = await async_db.get_fsm_record(key)
+                    record = _Record()
+                    if row is not None and row["updated_at"] >= time.time() - self.ttl:
+                        record = _Record(row["state"], json.loads(row["data"]), row["updated_at"])
+                    self._remember(key, record)
+            self._locks.pop(key, None)
+        else:
+            self._remember(key, record)
+        if record.updated_at and record.updated_at < time.time() - self.ttl:
+            record.state, record.data = None, {}
+        return record
+
+    def _remember(self, key: str, record: _Record) -> None:
+        self._records[key] = record
+        self._records.move_to_end(key)
+        while len(self._records) > self.maxsize:
+            # Несохраненные записи остаются в _dirty до ближайшего сброса
+            self._records.popitem(last=False)
+
+    def _touch(self, storage_key: StorageKey, record: _Record) -> None:
+        record.updated_at = time.time()
+        self._dirty[make_key(storage_key)] = record
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._load(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._load(key)
+        record.data = data.copy()
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._load(key)).data.copy()
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as exc:
+            logger.error("Не удалось сохранить состояния FSM: %s", exc)
+            if self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            upserts = [
+                (key, record.state, json.dumps(record.data, ensure_ascii=False), record.updated_at)
+                for key, record in batch.items()
+                if not record.empty
+            ]
+            deletes = [key for key, record in batch.items() if record.empty]
+            try:
+                await async_db.save_fsm_records(upserts, deletes)
+            except Exception:
+                self._dirty = {**batch, **self._dirty}
+                raise
+            for key, record in batch.items():
+                # Пустые состояния не держим в памяти, если их не изменили снова
+                if record.empty and key not in self._dirty:
+                    self._records.pop(key, None)
+
+    def start(self) -> None:
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            before = time.time() - self.ttl
+            try:
+                removed = await async_db.delete_expired_fsm_records(before)
+                if removed:
+                    logger.info("Удалено брошенных состояний FSM: %s", removed)
+            except Exception as exc:
+                logger.error("Не удалось очистить состояния FSM: %s", exc)
+            for key in [key for key, record in self._records.items() if record.updated_at < before]:
+                if key not in self._dirty:
+                    del self._records[key]
+            await asyncio.sleep(self.CLEANUP_INTERVAL)
+
+    async def close(self) -> None:
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            await asyncio.gather(self._cleanup_task, return_exceptions=True)
+            self._cleanup_task = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
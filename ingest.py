@@ -0,0 +1,76 @@
+"""
+Буферизованная запись активностей (write-behind с групповым коммитом).
+
+Активности копятся в памяти не дольше flush_interval секунд или до
+max_rows строк, затем записываются одной транзакцией. Окно
+flush_interval — это максимальное время, в течение которого уже
+подтвержденная пользователю запись может быть потеряна при аварии.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (user_id, category, value, created_at в секундах Unix)
+ActivityRow = Tuple[int, str, float, int]
+
+
+class ActivityBuffer:
+    def __init__(
+        self,
+        writer: Callable[[List[ActivityRow]], Awaitable[None]],
+        flush_interval: float = 0.05,
+        max_rows: int = 200,
+    ) -> None:
+        self._writer = writer
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self._pending: List[ActivityRow] = []
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def add(self, user_id: int, category: str, value: float) -> None:
+        if self._closed:
+            raise RuntimeError("Буфер активностей уже закрыт")
+        self._pending.append((user_id, category, value, int(time.time())))
+        if self.flush_interval <= 0:
+            await self.flush()
+        elif len(self._pending) >= self.max_rows:
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.error("Не удалось записать пачку активностей: %s", exc)
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as exc:
+            logger.error("Не удалось записать пачку активностей: %s", exc)
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+                self._timer = None
+            rows, self._pending = self._pending, []
+            if not rows:
+                return
+            try:
+                await self._writer(rows)
+            except Exception:
+                # Возвращаем строки в начало очереди, чтобы не потерять их
+                self._pending[:0] = rows
+                if self._timer is None and not self._closed:
+                    self._timer = asyncio.create_task(self._flush_later())
+                raise
+
+    async def close(self) -> None:
+        self._closed = True
+        await self.flush()
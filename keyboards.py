@@ -1,13 +1,6 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
 
-
-CATEGORY_LABELS = {
-    "pushups": "Отжимания",
-    "squats": "Приседания",
-    "pullups": "Подтягивания",
-    "running": "Бег",
-    "reading": "Прочитанные страницы",
-}
+from bot.categories import CategoryRegistry
 
 
 def main_menu(is_admin: bool = False) -> ReplyKeyboardMarkup:
@@ -26,27 +19,23 @@ REGISTER_BUTTON = ReplyKeyboardMarkup(
     resize_keyboard=True,
 )
 
-ACTIVITY_CHOICES = InlineKeyboardMarkup(
-    inline_keyboard=[
-        [InlineKeyboardButton(text="💪 Отжимания", callback_data="activity:pushups")],
-        [InlineKeyboardButton(text="🏋️ Приседания", callback_data="activity:squats")],
-        [InlineKeyboardButton(text="🧗 Подтягивания", callback_data="activity:pullups")],
-        [InlineKeyboardButton(text="🏃‍♂️ Бег (км)", callback_data="activity:running")],
-        [InlineKeyboardButton(text="📚 Прочитано", callback_data="activity:reading")],
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data="back:main")],
+
+def activity_choices(categories: CategoryRegistry) -> InlineKeyboardMarkup:
+    rows = [
+        [InlineKeyboardButton(text=category.activity_button, callback_data=f"activity:{category.key}")]
+        for category in categories
     ]
-)
+    rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back:main")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
-RATING_MENU = InlineKeyboardMarkup(
-    inline_keyboard=[
-        [InlineKeyboardButton(text="💪 Отжимания", callback_data="rating:pushups")],
-        [InlineKeyboardButton(text="🏋️ Приседания", callback_data="rating:squats")],
-        [InlineKeyboardButton(text="🧗 Подтягивания", callback_data="rating:pullups")],
-        [InlineKeyboardButton(text="🏃‍♂️ Бег", callback_data="rating:running")],
-        [InlineKeyboardButton(text="📚 Чтение", callback_data="rating:reading")],
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data="back:main")],
+
+def rating_choices(categories: CategoryRegistry) -> InlineKeyboardMarkup:
+    rows = [
+        [InlineKeyboardButton(text=category.rating_button, callback_data=f"rating:{category.key}")]
+        for category in categories
     ]
-)
+    rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back:main")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
 def approval_keyboard(user_id: int) -> InlineKeyboardMarkup:
@@ -0,0 +1,159 @@
+"""
+Рейтинги в памяти по категориям и периодам.
+
+Суммы хранятся по дневным корзинам за последний год. Для каждого
+сочетания (категория, период) поддерживается отсортированный список
+одобренных участников, поэтому чтение топ-N стоит O(N). При смене дня
+корзины, выпавшие из окна, вычитаются из сумм затронутых участников.
+"""
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Окно периода: сегодня и столько же полных дней назад (как в db.format_period)
+PERIOD_DAYS: Dict[str, Optional[int]] = {
+    "day": 0,
+    "week": 7,
+    "month": 30,
+    "year": 365,
+    "all": None,
+}
+HISTORY_DAYS = max(days for days in PERIOD_DAYS.values() if days is not None)
+
+RankKey = Tuple[float, int]
+
+
+class LeaderboardEngine:
+    def __init__(self, today: Optional[date] = None) -> None:
+        self._today = today or datetime.utcnow().date()
+        self._buckets: Dict[str, Dict[date, Dict[int, float]]] = {}
+        self._totals: Dict[Tuple[str, str], Dict[int, float]] = {}
+        self._rankings: Dict[Tuple[str, str], List[RankKey]] = {}
+        self._profiles: Dict[int, Tuple[str, str]] = {}
+        self._approved: set = set()
+
+    @classmethod
+    def from_snapshot(
+        cls,
+        users: Iterable[Tuple[int, str, str, str]],
+        daily: Iterable[Tuple[int, str, str, float]],
+        all_time: Iterable[Tuple[int, str, float]],
+        today: Optional[date] = None,
+    ) -> "LeaderboardEngine":
+        """
+        users — (user_id, full_name, city, status), daily — строки сводки
+        (user_id, category, day, total) за последний год, all_time —
+        (user_id, category, total) за все время.
+        """
+        engine = cls(today)
+        for user_id, full_name, city, status in users:
+            engine._profiles[user_id] = (full_name, city)
+            if status == "approved":
+                engine._approved.add(user_id)
+        horizon = engine._today - timedelta(days=HISTORY_DAYS)
+        for user_id, category, day_raw, total in daily:
+            day = date.fromisoformat(day_raw)
+            if day < horizon or day > engine._today:
+                continue
+            bucket = engine._buckets.setdefault(category, {}).setdefault(day, {})
+            bucket[user_id] = bucket.get(user_id, 0.0) + total
+            for period, days in PERIOD_DAYS.items():
+                if days is not None and day >= engine._today - timedelta(days=days):
+                    totals = engine._totals.setdefault((category, period), {})
+                    totals[user_id] = totals.get(user_id, 0.0) + total
+        for user_id, category, total in all_time:
+            engine._totals.setdefault((category, "all"), {})[user_id] = total
+        for key, totals in engine._totals.items():
+            engine._rankings[key] = sorted(
+                (-total, user_id) for user_id, total in totals.items() if user_id in engine._approved
+            )
+        return engine
+
+    def record(self, user_id: int, category: str, value: float, created_at: datetime) -> None:
+        self._roll()
+        day = created_at.date()
+        if day > self._today:
+            day = self._today
+        if day >= self._today - timedelta(days=HISTORY_DAYS):
+            bucket = self._buckets.setdefault(category, {}).setdefault(day, {})
+            bucket[user_id] = bucket.get(user_id, 0.0) + value
+        for period, days in PERIOD_DAYS.items():
+            if days is None or day >= self._today - timedelta(days=days):
+                totals = self._totals.setdefault((category, period), {})
+                self._set_total(category, period, user_id, totals.get(user_id, 0.0) + value)
+
+    def set_profile(self, user_id: int, full_name: str, city: str) -> None:
+        self._profiles[user_id] = (full_name, city)
+
+    def set_status(self, user_id: int, status: str) -> None:
+        approved = status == "approved"
+        if approved == (user_id in self._approved):
+            return
+        for (category, period), totals in self._totals.items():
+            total = totals.get(user_id)
+            if total is None:
+                continue
+            ranking = self._rankings.setdefault((category, period), [])
+            if approved:
+                insort(ranking, (-total, user_id))
+            else:
+                self._remove_rank(ranking, (-total, user_id))
+        if approved:
+            self._approved.add(user_id)
+        else:
+            self._approved.discard(user_id)
+
+    def top(self, category: str, period: str, limit: int = 10) -> List[Dict[str, object]]:
+        self._roll()
+        ranking = self._rankings.get((category, period), [])
+        rows = []
+        for negative_total, user_id in ranking[:limit]:
+            full_name, city = self._profiles.get(user_id, ("", ""))
+            rows.append({"full_name": full_name, "city": city, "total": -negative_total})
+        return rows
+
+    def _set_total(self, category: str, period: str, user_id: int, total: float) -> None:
+        totals = self._totals.setdefault((category, period), {})
+        ranking = self._rankings.setdefault((category, period), [])
+        previous = totals.get(user_id)
+        approved = user_id in self._approved
+        if previous is not None and approved:
+            self._remove_rank(ranking, (-previous, user_id))
+        if total <= 0:
+            totals.pop(user_id, None)
+            return
+        totals[user_id] = total
+        if approved:
+            insort(ranking, (-total, user_id))
+
+    @staticmethod
+    def _remove_rank(ranking: List[RankKey], key: RankKey) -> None:
+        index = bisect_left(ranking, key)
+        if index < len(ranking) and ranking[index] == key:
+            ranking.pop(index)
+
+    def _roll(self) -> None:
+        today = datetime.utcnow().date()
+        if today <= self._today:
+            return
+        previous, self._today = self._today, today
+        for category, buckets in self._buckets.items():
+            for period, days in PERIOD_DAYS.items():
+                if days is None:
+                    continue
+                window_start = today - timedelta(days=days)
+                day = previous - timedelta(days=days)
+                affected = set()
+                while day < window_start:
+                    affected.update(buckets.get(day, ()))
+                    day += timedelta(days=1)
+                for user_id in affected:
+                    # Пересчитываем сумму по оставшимся корзинам, а не вычитаем,
+                    # чтобы не копить погрешность вещественных чисел
+                    total = 0.0
+                    for offset in range(days + 1):
+                        total += buckets.get(window_start + timedelta(days=offset), {}).get(user_id, 0.0)
+                    self._set_total(category, period, user_id, total)
+            horizon = today - timedelta(days=HISTORY_DAYS)
+            for day in [day for day in buckets if day < horizon]:
+                del buckets[day]
@@ -2,208 +2,103 @@ import asyncio
 import logging
 import os
 import sys
-import random
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Optional, Tuple
 
 # Добавьте путь для корректных импортов
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from aiogram import Bot, Dispatcher, F
-from aiogram.enums import ParseMode
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
 
-from bot import db
+from bot import async_db
+from bot.broadcast import Broadcaster
 from bot.config import settings
+from bot.fsm_storage import SQLiteStorage
 from bot.keyboards import (
-    ACTIVITY_CHOICES,
-    CATEGORY_LABELS,
-    RATING_MENU,
     REGISTER_BUTTON,
-    main_menu,
+    activity_choices,
     approval_keyboard,
+    main_menu,
+    rating_choices,
 )
+from bot.message_store import MessageIdStore
+from bot.outbox import NotificationOutbox
+from bot.ratelimit import TokenBucket
+from bot.scheduler import UpdateScheduler
 from bot.states import ActivityState, BroadcastState, RatingState, RegistrationState
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-# ==================== ФУНКЦИЯ СОЗДАНИЯ БОТА С ПРОКСИ ====================
-async def create_bot_with_proxy(token: str) -> Bot:
-    """
-    Автоматически подбирает рабочий прокси-сервер за границей
-    для обхода блокировки Telegram в России
-    """
-    print("=" * 60)
-    print("🌍 ПОИСК РАБОЧЕГО ПРОКСИ-СЕРВЕРА ЗА ГРАНИЦЕЙ")
-    print("=" * 60)
-
-    # Список публичных прокси-серверов в разных странах
-    # Эти серверы находятся за пределами России и обходят блокировку
-    PROXY_SERVERS = [
-        # 🇺🇸 США
-        {"url": "socks5://45.77.56.114:9050", "country": "США", "city": "Нью-Йорк"},
-        {"url": "socks5://138.197.157.60:9050", "country": "США", "city": "Сан-Франциско"},
-        {"url": "socks5://209.97.150.167:9050", "country": "США", "city": "Чикаго"},
-
-        # 🇩🇪 Германия
-        {"url": "socks5://185.199.229.156:7492", "country": "Германия", "city": "Франкфурт"},
-        {"url": "socks5://188.166.216.198:9050", "country": "Германия", "city": "Берлин"},
-
-        # 🇳🇱 Нидерланды
-        {"url": "socks5://178.62.193.19:9050", "country": "Нидерланды", "city": "Амстердам"},
-
-        # 🇸🇬 Сингапур
-        {"url": "socks5://128.199.202.122:9050", "country": "Сингапур", "city": "Сингапур"},
-
-        # 🇯🇵 Япония
-        {"url": "socks5://45.32.234.150:9050", "country": "Япония", "city": "Токио"},
-
-        # 🇫🇷 Франция
-        {"url": "socks5://51.158.68.133:8811", "country": "Франция", "city": "Париж"},
-
-        # 🇬🇧 Великобритания
-        {"url": "socks5://51.15.122.122:9050", "country": "Великобритания", "city": "Лондон"},
-
-        # 🇨🇦 Канада
-        {"url": "socks5://159.203.87.129:9050", "country": "Канада", "city": "Торонто"},
-    ]
-
-    # Перемешиваем список для рандомизации
-    random.shuffle(PROXY_SERVERS)
-
-    bot_instance = None
-    working_proxy = None
-
-    for idx, proxy in enumerate(PROXY_SERVERS, 1):
-        try:
-            print(f"🔄 Попытка {idx}/{len(PROXY_SERVERS)}: {proxy['country']} ({proxy['city']})")
-
-            # Импортируем библиотеку для прокси
-            from aiohttp_socks import ProxyConnector
-            import aiohttp
-
-            # Создаем подключение через прокси
-            connector = ProxyConnector.from_url(proxy['url'])
-            session = aiohttp.ClientSession(connector=connector)
-
-            # Создаем бота с этой сессией
-            bot_instance = Bot(
-                token=token,
-                parse_mode=ParseMode.HTML,
-                session=session
-            )
-
-            # Тестируем подключение (быстрая проверка)
-            me = await bot_instance.get_me(request_timeout=15)
-
-            working_proxy = proxy
-            print(f"✅ УСПЕХ! Найден рабочий прокси в {proxy['country']}!")
-            print(f"   📡 Подключение через: {proxy['url']}")
-            print(f"   🤖 Бот: @{me.username} (ID: {me.id})")
-            print("=" * 60)
-
-            return bot_instance
-
-        except ImportError:
-            print("❌ Библиотека aiohttp-socks не установлена!")
-            print("   Установите: pip install aiohttp-socks")
-            break
-
-        except Exception as e:
-            error_msg = str(e)
-            if "timeout" in error_msg.lower():
-                print(f"   ⏰ Таймаут соединения")
-            elif "connection refused" in error_msg.lower():
-                print(f"   🔌 Соединение отклонено")
-            else:
-                print(f"   ❌ Ошибка: {error_msg[:50]}...")
-
-            # Закрываем сессию если была создана
-            if 'session' in locals():
-                await session.close()
-
-            continue
-
-    # Если ни один прокси не сработал
-    if bot_instance is None:
-        print("⚠️ ВНИМАНИЕ: Ни один прокси не сработал!")
-        print("   Пробуем прямое подключение (требуется VPN)...")
-        print("=" * 60)
-
-        # Пробуем создать бота без прокси (требуется VPN)
-        try:
-            bot_instance = Bot(token=token, parse_mode=ParseMode.HTML)
-            me = await bot_instance.get_me(request_timeout=15)
-            print(f"✅ Прямое подключение работает (VPN включен)")
-            print(f"   🤖 Бот: @{me.username}")
-            return bot_instance
-        except Exception as e:
-            print(f"❌ Прямое подключение тоже не работает: {e}")
-            print("   ВКЛЮЧИТЕ VPN и перезапустите бота!")
-            raise ConnectionError("Не удалось подключиться к Telegram API")
-
-    return bot_instance
-
-
 def ensure_data_dir() -> None:
     data_dir = os.path.dirname(settings.database_path)
     if data_dir:
         os.makedirs(data_dir, exist_ok=True)
 
 
-def require_approved(user_id: int) -> bool:
-    user = db.get_user(user_id)
+async def require_approved(user_id: int) -> bool:
+    user = await async_db.get_user(user_id)
     return bool(user and user["status"] == "approved")
 
 
-def format_leaderboard(category: str, period_label: str, since: Optional[datetime]):
-    leaderboard = db.get_leaderboard(category, since)
+async def format_leaderboard(category: str, period_key: str):
+    cache = async_db.leaderboard_cache
+    cached = cache.get((category, period_key))
+    if cached is not None:
+        return cached[1]
+    stamp = cache.stamp
+    leaderboard = await async_db.get_period_leaderboard(category, period_key)
     lines = [
-        f"🏆 Топ по категории {CATEGORY_LABELS.get(category, category)} ({period_label})",
+        f"🏆 Топ по категории {async_db.categories.label(category)} ({get_period_label(period_key)})",
     ]
     if not leaderboard:
         lines.append("Пока никто не оставлял записи. Будьте первым!")
-        return "\n".join(lines)
-    for idx, row in enumerate(leaderboard, start=1):
-        lines.append(f"{idx}. {row['full_name']} ({row['city']}) — {row['total']}")
-    return "\n".join(lines)
+    else:
+        for idx, row in enumerate(leaderboard, start=1):
+            lines.append(f"{idx}. {row['full_name']} ({row['city']}) — {row['total']}")
+    text = "\n".join(lines)
+    cache.set((category, period_key), (leaderboard, text), stamp=stamp)
+    return text
 
 
-def format_personal_stats(user_id: int) -> str:
-    profile = db.get_profile(user_id)
+async def format_personal_stats(user_id: int) -> str:
+    profile = await async_db.get_profile(user_id)
     if not profile:
         return "Вы еще не зарегистрированы."
-    created_at = datetime.fromisoformat(profile["created_at"])
+    created_at = datetime.utcfromtimestamp(profile["created_at"])
     days_in_bot = (datetime.utcnow() - created_at).days
-    last_activity_raw = profile["last_activity_at"]
-    last_activity_text = "нет записей" if not last_activity_raw else f"{last_activity_raw}"
+    last_activity_at = profile["last_activity_at"]
+    last_activity_text = (
+        "нет записей"
+        if last_activity_at is None
+        else datetime.utcfromtimestamp(last_activity_at).strftime("%Y-%m-%d %H:%M UTC")
+    )
 
     periods = {
         "day": "За 1 день",
         "week": "За неделю",
         "month": "За месяц",
     }
-    stats = db.get_personal_all_stats(user_id)
+    stats = await async_db.get_stats_matrix([user_id], async_db.categories.keys(), list(periods))
     lines = [
         f"👤 {profile['full_name']}\n📞 {profile['phone']}\n🏙️ {profile['city']}\n🗓️ В боте {days_in_bot} дн.",
         f"⏰ Последняя запись: {last_activity_text}",
         "\n📊 Ваша статистика:",
     ]
-    grouped = {(cat, period): total for cat, period, total in stats}
     for period_key, period_label in periods.items():
         lines.append(f"\n{period_label}:")
-        for cat_key, cat_label in CATEGORY_LABELS.items():
-            total = grouped.get((cat_key, period_key), 0)
-            lines.append(f"• {cat_label}: {total}")
+        for category in async_db.categories:
+            total = stats[(user_id, category.key, period_key)]
+            lines.append(f"• {category.label}: {total}")
     return "\n".join(lines)
 
 
 async def ensure_access(message: Message, state: FSMContext | None = None) -> bool:
-    user = db.get_user(message.from_user.id)
+    user = await async_db.get_user(message.from_user.id)
     if not user:
         await send_compact(
             message.bot,
@@ -275,33 +170,73 @@ def get_period_label(period_key: str) -> str:
 
 
 def is_admin(user_id: int) -> bool:
-    if user_id in settings.admin_ids:
-        return True
-    user = db.get_user(user_id)
-    if user and user["phone"] in settings.admin_phones:
-        return True
-    return False
+    return user_id in async_db.admin_index
+
+
+def users_page_callback(list_key: str, direction: str, user) -> str:
+    # created_at последним, разбираем с maxsplit: поля перед ним фиксированы
+    return f"users:{list_key}:{direction}:{user['user_id']}:{user['created_at']}"
+
 
+def parse_users_page_callback(data: str) -> Optional[Tuple[str, str, Tuple[int, int]]]:
+    """(список, направление, курсор) из users_page_callback или None для поврежденных данных."""
+    parts = data.split(":", 4)
+    if len(parts) != 5:
+        return None
+    _, list_key, direction, user_id, created_at = parts
+    if list_key not in USER_LISTS or direction not in ("prev", "next"):
+        return None
+    try:
+        return list_key, direction, (int(created_at), int(user_id))
+    except ValueError:
+        return None
 
-def build_users_keyboard(users, action: str) -> InlineKeyboardMarkup:
+
+def build_users_keyboard(
+    users, action: str, list_key: str, has_prev: bool = False, has_next: bool = False
+) -> InlineKeyboardMarkup:
     rows = []
     for user in users:
         label = f"{'🚫' if action == 'ban' else '♻️'} {user['full_name']} ({user['city']})"
         callback = f"{action}:{user['user_id']}"
         rows.append([InlineKeyboardButton(text=label, callback_data=callback)])
+    navigation = []
+    if has_prev:
+        navigation.append(
+            InlineKeyboardButton(text="◀️ Назад", callback_data=users_page_callback(list_key, "prev", users[0]))
+        )
+    if has_next:
+        navigation.append(
+            InlineKeyboardButton(text="Далее ▶️", callback_data=users_page_callback(list_key, "next", users[-1]))
+        )
+    if navigation:
+        rows.append(navigation)
     rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back:main")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
-dp = Dispatcher()
-_last_message_ids: Dict[int, int] = {}
+fsm_storage = SQLiteStorage(
+    maxsize=settings.fsm_cache_size,
+    flush_interval=settings.fsm_flush_ms / 1000,
+    ttl=settings.fsm_ttl_hours * 3600,
+)
+scheduler = UpdateScheduler(
+    concurrency=settings.update_concurrency,
+    max_pending=settings.update_max_pending,
+    report_interval=settings.update_stats_interval,
+)
+dp = Dispatcher(storage=fsm_storage, events_isolation=scheduler)
+message_ids = MessageIdStore(
+    maxsize=settings.message_store_size,
+    flush_interval=settings.message_store_flush_ms / 1000,
+)
 BACK_MAIN_INLINE = InlineKeyboardMarkup(
     inline_keyboard=[[InlineKeyboardButton(text="⬅️ Назад", callback_data="back:main")]]
 )
 
 
 async def send_compact(bot: Bot, chat_id: int, text: str, reply_markup=None) -> None:
-    message_id = _last_message_ids.get(chat_id)
+    message_id = await message_ids.get(chat_id)
     if message_id:
         try:
             await bot.edit_message_text(
@@ -314,7 +249,7 @@ async def send_compact(bot: Bot, chat_id: int, text: str, reply_markup=None) ->
         except Exception as exc:
             logger.debug("Не удалось отредактировать сообщение %s: %s", message_id, exc)
     sent = await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
-    _last_message_ids[chat_id] = sent.message_id
+    message_ids.set(chat_id, sent.message_id)
 
 
 async def try_delete_message(message: Message | CallbackQuery) -> None:
@@ -328,7 +263,7 @@ async def try_delete_message(message: Message | CallbackQuery) -> None:
 @dp.message(CommandStart())
 async def handle_start(message: Message, state: FSMContext):
     await state.clear()
-    user = db.get_user(message.from_user.id)
+    user = await async_db.get_user(message.from_user.id)
     if not user:
         await send_compact(
             message.bot,
@@ -406,7 +341,7 @@ async def registration_city(message: Message, state: FSMContext):
 
 
 @dp.message(RegistrationState.age)
-async def registration_age(message: Message, state: FSMContext, bot: Bot):
+async def registration_age(message: Message, state: FSMContext, bot: Bot, outbox: NotificationOutbox):
     try:
         age = int(message.text.strip())
         if age <= 0:
@@ -419,7 +354,7 @@ async def registration_age(message: Message, state: FSMContext, bot: Bot):
         return
 
     data = await state.get_data()
-    db.add_user(
+    await async_db.add_user(
         user_id=message.from_user.id,
         full_name=data["full_name"],
         phone=data["phone"],
@@ -435,57 +370,51 @@ async def registration_age(message: Message, state: FSMContext, bot: Bot):
     await try_delete_message(message)
 
     for admin_id in settings.admin_ids:
-        try:
-            await bot.send_message(
-                admin_id,
-                (
-                    "Новая заявка на регистрацию:\n"
-                    f"👤 {data['full_name']}\n"
-                    f"📞 {data['phone']}\n"
-                    f"🏙️ {data['city']}\n"
-                    f"🎂 {age} лет"
-                ),
-                reply_markup=approval_keyboard(message.from_user.id),
-            )
-        except Exception as exc:
-            logger.error("Не удалось отправить уведомление админу %s: %s", admin_id, exc)
+        await outbox.enqueue(
+            admin_id,
+            (
+                "Новая заявка на регистрацию:\n"
+                f"👤 {data['full_name']}\n"
+                f"📞 {data['phone']}\n"
+                f"🏙️ {data['city']}\n"
+                f"🎂 {age} лет"
+            ),
+            reply_markup=approval_keyboard(message.from_user.id),
+            dedup_key=f"registration:{message.from_user.id}:{admin_id}",
+        )
 
 
 @dp.callback_query(F.data.startswith("approve:"))
-async def approve_user(callback: CallbackQuery, bot: Bot):
+async def approve_user(callback: CallbackQuery, outbox: NotificationOutbox):
     if not is_admin(callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     user_id = int(callback.data.split(":")[1])
-    db.set_user_status(user_id, "approved")
+    await async_db.set_user_status(user_id, "approved")
     await callback.answer("Пользователь одобрен")
-    try:
-        await send_compact(
-            bot,
-            user_id,
-            "Ура! 🎉 Ваша регистрация одобрена. Можете пользоваться ботом.",
-            reply_markup=main_menu(is_admin=is_admin(user_id)),
-        )
-    except Exception as exc:
-        logger.error("Не удалось отправить сообщение пользователю %s: %s", user_id, exc)
+    await outbox.enqueue(
+        user_id,
+        "Ура! 🎉 Ваша регистрация одобрена. Можете пользоваться ботом.",
+        reply_markup=main_menu(is_admin=is_admin(user_id)),
+        dedup_key=f"status:{user_id}",
+        compact=True,
+    )
 
 
 @dp.callback_query(F.data.startswith("reject:"))
-async def reject_user(callback: CallbackQuery, bot: Bot):
+async def reject_user(callback: CallbackQuery, outbox: NotificationOutbox):
     if not is_admin(callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     user_id = int(callback.data.split(":")[1])
-    db.set_user_status(user_id, "rejected")
+    await async_db.set_user_status(user_id, "rejected")
     await callback.answer("Пользователь отклонен")
-    try:
-        await send_compact(
-            bot,
-            user_id,
-            "К сожалению, ваша заявка отклонена. Свяжитесь с администратором, чтобы узнать детали.",
-        )
-    except Exception as exc:
-        logger.error("Не удалось отправить сообщение пользователю %s: %s", user_id, exc)
+    await outbox.enqueue(
+        user_id,
+        "К сожалению, ваша заявка отклонена. Свяжитесь с администратором, чтобы узнать детали.",
+        dedup_key=f"status:{user_id}",
+        compact=True,
+    )
 
 
 @dp.message(F.text == "✍️ Записать")
@@ -497,7 +426,7 @@ async def choose_activity(message: Message, state: FSMContext):
         message.bot,
         message.chat.id,
         "Выберите, что хотите записать:",
-        reply_markup=ACTIVITY_CHOICES,
+        reply_markup=activity_choices(async_db.categories),
     )
     await try_delete_message(message)
 
@@ -505,12 +434,15 @@ async def choose_activity(message: Message, state: FSMContext):
 @dp.callback_query(ActivityState.category, F.data.startswith("activity:"))
 async def activity_selected(callback: CallbackQuery, state: FSMContext):
     _, category = callback.data.split(":", maxsplit=1)
+    if category not in async_db.categories:
+        await callback.answer("Категория больше недоступна", show_alert=True)
+        return
     await state.update_data(category=category)
     await state.set_state(ActivityState.value)
     await send_compact(
         callback.message.bot,
         callback.message.chat.id,
-        f"Сколько \"{CATEGORY_LABELS.get(category, category)}\" добавить? Введите число.",
+        f"Сколько \"{async_db.categories.label(category)}\" добавить? Введите число.",
     )
     await callback.answer()
 
@@ -519,6 +451,16 @@ async def activity_selected(callback: CallbackQuery, state: FSMContext):
 async def activity_value(message: Message, state: FSMContext):
     data = await state.get_data()
     category = data.get("category")
+    if category not in async_db.categories:
+        await state.clear()
+        await send_compact(
+            message.bot,
+            message.chat.id,
+            "Категория не выбрана, начните заново.",
+            reply_markup=main_menu(is_admin=is_admin(message.from_user.id)),
+        )
+        await try_delete_message(message)
+        return
     try:
         value = float(message.text.replace(",", "."))
         if value <= 0:
@@ -527,12 +469,12 @@ async def activity_value(message: Message, state: FSMContext):
         await send_compact(message.bot, message.chat.id, "Введите положительное число.")
         await try_delete_message(message)
         return
-    db.add_activity(message.from_user.id, category, value)
+    await async_db.add_activity(message.from_user.id, category, value)
     await state.clear()
     await send_compact(
         message.bot,
         message.chat.id,
-        f"Записано! {CATEGORY_LABELS.get(category, category)}: {value}",
+        f"Записано! {async_db.categories.label(category)}: {value}",
         reply_markup=main_menu(is_admin=is_admin(message.from_user.id)),
     )
     await try_delete_message(message)
@@ -545,7 +487,7 @@ async def rating_menu(message: Message, state: FSMContext):
     await state.clear()
     await state.set_state(RatingState.category)
     await send_compact(
-        message.bot, message.chat.id, "Выберите категорию рейтинга:", reply_markup=RATING_MENU
+        message.bot, message.chat.id, "Выберите категорию рейтинга:", reply_markup=rating_choices(async_db.categories)
     )
     await try_delete_message(message)
 
@@ -553,11 +495,14 @@ async def rating_menu(message: Message, state: FSMContext):
 @dp.callback_query(RatingState.category, F.data.startswith("rating:"))
 async def rating_category(callback: CallbackQuery, state: FSMContext):
     _, category = callback.data.split(":", maxsplit=1)
+    if category not in async_db.categories:
+        await callback.answer("Категория больше недоступна", show_alert=True)
+        return
     await state.update_data(category=category)
     await send_compact(
         callback.message.bot,
         callback.message.chat.id,
-        f"Показываю рейтинги для \"{CATEGORY_LABELS.get(category, category)}\". Выберите период:",
+        f"Показываю рейтинги для \"{async_db.categories.label(category)}\". Выберите период:",
         reply_markup=period_keyboard(category),
     )
     await callback.answer()
@@ -566,8 +511,10 @@ async def rating_category(callback: CallbackQuery, state: FSMContext):
 @dp.callback_query(F.data.startswith("period:"))
 async def rating_period(callback: CallbackQuery, state: FSMContext):
     _, category, period_key = callback.data.split(":")
-    since = db.format_period(period_key)
-    text = format_leaderboard(category, get_period_label(period_key), since)
+    if category not in async_db.categories:
+        await callback.answer("Категория больше недоступна", show_alert=True)
+        return
+    text = await format_leaderboard(category, period_key)
     await send_compact(callback.message.bot, callback.message.chat.id, text)
     await callback.answer()
     await state.clear()
@@ -580,7 +527,7 @@ async def back_to_rating(callback: CallbackQuery, state: FSMContext):
         callback.message.bot,
         callback.message.chat.id,
         "Выберите категорию рейтинга:",
-        reply_markup=RATING_MENU,
+        reply_markup=rating_choices(async_db.categories),
     )
     await callback.answer()
 
@@ -601,7 +548,7 @@ async def back_to_main(callback: CallbackQuery, state: FSMContext):
 async def about_me(message: Message):
     if not await ensure_access(message):
         return
-    await send_compact(message.bot, message.chat.id, format_personal_stats(message.from_user.id))
+    await send_compact(message.bot, message.chat.id, await format_personal_stats(message.from_user.id))
     await try_delete_message(message)
 
 
@@ -620,25 +567,19 @@ async def start_broadcast(message: Message, state: FSMContext):
 
 
 @dp.message(BroadcastState.waiting_for_message)
-async def send_broadcast(message: Message, state: FSMContext, bot: Bot):
+async def send_broadcast(message: Message, state: FSMContext, broadcaster: Broadcaster):
     if not is_admin(message.from_user.id):
         await send_compact(message.bot, message.chat.id, "Эта функция доступна только администратору.")
         await state.clear()
         return
     text = message.text
-    sent = 0
-    failed = 0
-    for user_id in db.get_registered_users(["approved"]):
-        try:
-            await bot.send_message(user_id, f"📢 Сообщение от админа:\n{text}")
-            sent += 1
-        except Exception as exc:
-            failed += 1
-            logger.error("Не удалось отправить рассылку %s: %s", user_id, exc)
+    job_id = await broadcaster.start(
+        message.chat.id, f"📢 Сообщение от админа:\n{text}", ["approved"]
+    )
     await send_compact(
         message.bot,
         message.chat.id,
-        f"Готово! Успешно: {sent}. Не доставлено: {failed}.",
+        f"Рассылка #{job_id} запущена. Прогресс обновляется в отдельном сообщении.",
         reply_markup=main_menu(is_admin=True),
     )
     await state.clear()
@@ -657,17 +598,37 @@ def format_users_block(title: str, users: list) -> str:
     return "\n".join(lines)
 
 
+USERS_PAGE_SIZE = 25
+# Ключ в callback_data -> (статусы, заголовок, действие кнопок)
+USER_LISTS = {
+    "members": (("approved", "pending"), "👥 Участники (одобренные и на проверке)", "ban"),
+    "banned": (("banned",), "🚫 Черный список", "unban"),
+}
+
+
+async def show_users_page(
+    bot: Bot, chat_id: int, list_key: str, direction: Optional[str] = None, cursor=None
+) -> None:
+    statuses, title, action = USER_LISTS[list_key]
+    after = cursor if direction == "next" else None
+    before = cursor if direction == "prev" else None
+    users, has_prev, has_next = await async_db.list_users_page(statuses, USERS_PAGE_SIZE, after, before)
+    if not users and cursor is not None:
+        # Страница опустела (пользователей удалили или перевели) — показываем первую
+        users, has_prev, has_next = await async_db.list_users_page(statuses, USERS_PAGE_SIZE)
+    text = format_users_block(title, users)
+    keyboard = (
+        build_users_keyboard(users, action, list_key, has_prev, has_next) if users else BACK_MAIN_INLINE
+    )
+    await send_compact(bot, chat_id, text, reply_markup=keyboard)
+
+
 @dp.message(F.text == "👥 Участники")
 async def list_participants(message: Message):
     if not is_admin(message.from_user.id):
         await send_compact(message.bot, message.chat.id, "Эта функция доступна только администратору.")
         return
-    all_users = db.list_users_by_status(["approved", "pending"])
-    users = all_users[:25]
-    note = "" if len(all_users) <= len(users) else "\nПоказаны первые 25 записей."
-    text = format_users_block("👥 Участники (одобренные и на проверке)", users) + note
-    keyboard = build_users_keyboard(users, "ban") if users else BACK_MAIN_INLINE
-    await send_compact(message.bot, message.chat.id, text, reply_markup=keyboard)
+    await show_users_page(message.bot, message.chat.id, "members")
     await try_delete_message(message)
 
 
@@ -676,22 +637,31 @@ async def list_blacklist(message: Message):
     if not is_admin(message.from_user.id):
         await send_compact(message.bot, message.chat.id, "Эта функция доступна только администратору.")
         return
-    all_users = db.list_users_by_status(["banned"])
-    users = all_users[:25]
-    note = "" if len(all_users) <= len(users) else "\nПоказаны первые 25 записей."
-    text = format_users_block("🚫 Черный список", users) + note
-    keyboard = build_users_keyboard(users, "unban") if users else BACK_MAIN_INLINE
-    await send_compact(message.bot, message.chat.id, text, reply_markup=keyboard)
+    await show_users_page(message.bot, message.chat.id, "banned")
     await try_delete_message(message)
 
 
+@dp.callback_query(F.data.startswith("users:"))
+async def page_users(callback: CallbackQuery):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Недостаточно прав", show_alert=True)
+        return
+    parsed = parse_users_page_callback(callback.data)
+    if parsed is None:
+        await callback.answer("Список устарел, откройте его заново", show_alert=True)
+        return
+    list_key, direction, cursor = parsed
+    await callback.answer()
+    await show_users_page(callback.message.bot, callback.message.chat.id, list_key, direction, cursor)
+
+
 @dp.callback_query(F.data.startswith("ban:"))
-async def ban_user(callback: CallbackQuery):
+async def ban_user(callback: CallbackQuery, outbox: NotificationOutbox):
     if not is_admin(callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     user_id = int(callback.data.split(":")[1])
-    db.set_user_status(user_id, "banned")
+    await async_db.set_user_status(user_id, "banned")
     await callback.answer("Пользователь занесен в черный список")
     await send_compact(
         callback.message.bot,
@@ -699,23 +669,21 @@ async def ban_user(callback: CallbackQuery):
         "🚫 Пользователь добавлен в черный список.",
         reply_markup=main_menu(is_admin=True),
     )
-    try:
-        await send_compact(
-            callback.message.bot,
-            user_id,
-            "🚫 Вы добавлены в черный список. Свяжитесь с администратором для разблокировки.",
-        )
-    except Exception as exc:
-        logger.debug("Не удалось уведомить заблокированного пользователя %s: %s", user_id, exc)
+    await outbox.enqueue(
+        user_id,
+        "🚫 Вы добавлены в черный список. Свяжитесь с администратором для разблокировки.",
+        dedup_key=f"status:{user_id}",
+        compact=True,
+    )
 
 
 @dp.callback_query(F.data.startswith("unban:"))
-async def unban_user(callback: CallbackQuery):
+async def unban_user(callback: CallbackQuery, outbox: NotificationOutbox):
     if not is_admin(callback.from_user.id):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     user_id = int(callback.data.split(":")[1])
-    db.set_user_status(user_id, "approved")
+    await async_db.set_user_status(user_id, "approved")
     await callback.answer("Пользователь разбанен")
     await send_compact(
         callback.message.bot,
@@ -723,41 +691,104 @@ async def unban_user(callback: CallbackQuery):
         "✅ Пользователь разблокирован и возвращен в список одобренных.",
         reply_markup=main_menu(is_admin=True),
     )
-    try:
-        await send_compact(
-            callback.message.bot,
-            user_id,
-            "✅ Вы разблокированы! Доступ к боту восстановлен.",
-            reply_markup=main_menu(is_admin=is_admin(user_id)),
-        )
-    except Exception as exc:
-        logger.debug("Не удалось уведомить разблокированного пользователя %s: %s", user_id, exc)
+    await outbox.enqueue(
+        user_id,
+        "✅ Вы разблокированы! Доступ к боту восстановлен.",
+        reply_markup=main_menu(is_admin=is_admin(user_id)),
+        dedup_key=f"status:{user_id}",
+        compact=True,
+    )
 
 
-async def main() -> None:
-    # Проверяем наличие библиотеки для прокси
-    try:
-        import aiohttp_socks
-        print("✅ Библиотека aiohttp-socks установлена")
-    except ImportError:
-        print("⚠️ Установите библиотеку для прокси: pip install aiohttp-socks")
+async def create_bot() -> Bot:
+    if settings.run_mode == "webhook" and settings.webhook_local_test:
+        # Локальный прогон: обновления шлет post_fake_updates, ответы бота
+        # остаются в процессе и до api.telegram.org не доходят
+        from bot.fake_telegram import FakeTelegramSession
+
+        return Bot(token=settings.bot_token, session=FakeTelegramSession())
+    # Подбор прокси тянет aiohttp_socks и сетевой стек — импортируем только здесь
+    from bot.proxy import create_bot_with_proxy
+
+    # Создаем бота с автоматическим подбором прокси
+    return await create_bot_with_proxy(settings.bot_token)
+
+
+def create_services(
+    bot: Bot, send_rate: float, shard: int = 0, shards: int = 1, send_limiter=None
+) -> Tuple[Broadcaster, NotificationOutbox]:
+    """
+    Рассыльщик и очередь уведомлений с общим лимитом отправки send_rate
+    сообщений/с. Очередь отправляет только уведомления чатов своего шарда.
+    Воркеры передают send_limiter, общий для всех процессов.
+    """
+    if send_limiter is None:
+        send_limiter = TokenBucket(send_rate)
+    broadcaster = Broadcaster(
+        bot,
+        send_limiter,
+        concurrency=settings.broadcast_concurrency,
+        max_attempts=settings.broadcast_max_attempts,
+    )
+    outbox = NotificationOutbox(
+        bot,
+        send_limiter,
+        send_compact,
+        concurrency=settings.outbox_concurrency,
+        max_attempts=settings.outbox_max_attempts,
+        shard=shard,
+        shards=shards,
+    )
+    return broadcaster, outbox
+
 
+async def close_services(
+    broadcaster: Optional[Broadcaster], outbox: Optional[NotificationOutbox]
+) -> None:
+    if broadcaster is not None:
+        await broadcaster.stop()
+    if outbox is not None:
+        await outbox.stop()
+    await scheduler.stop()
+    await message_ids.close()
+    await fsm_storage.close()
+    logger.info("Кэш рейтингов: %s", async_db.leaderboard_cache.stats())
+    logger.info("Кэш пользователей: %s", async_db.user_cache.stats())
+    await async_db.shutdown()
+
+
+async def main() -> None:
     ensure_data_dir()
-    db.init_db()
+    await async_db.init_db()
 
     if not settings.bot_token:
         raise RuntimeError("Не указан токен бота.")
 
+    if settings.workers > 1:
+        from bot.workers import run_sharded
+
+        try:
+            await run_sharded()
+        finally:
+            await async_db.shutdown()
+        return
+
+    await async_db.load_leaderboard()
+    await async_db.warm_user_cache()
+    await async_db.load_admin_index()
+
     print("\n" + "=" * 60)
     print("🚀 ЗАПУСК ФИТНЕС-ТРЕКЕР БОТА")
     print("=" * 60)
 
+    broadcaster = None
+    outbox = None
     try:
-        # Создаем бота с автоматическим подбором прокси
-        bot = await create_bot_with_proxy(settings.bot_token)
+        bot = await create_bot()
 
-        # Пропускаем проверку вебхука (для России)
-        print("⏩ Пропускаем проверку вебхука (оптимизация для РФ)")
+        if settings.run_mode != "webhook":
+            # Пропускаем проверку вебхука (для России)
+            print("⏩ Пропускаем проверку вебхука (оптимизация для РФ)")
 
         print("=" * 60)
         print("✅ БОТ УСПЕШНО ЗАПУЩЕН!")
@@ -768,8 +799,21 @@ async def main() -> None:
         print("Для остановки нажмите Ctrl+C")
         print("=" * 60 + "\n")
 
-        # Запускаем polling
-        await dp.start_polling(bot, skip_updates=True)
+        # Общий лимит отправки сообщений и незавершенные рассылки
+        broadcaster, outbox = create_services(bot, settings.send_rate_limit)
+        await broadcaster.resume()
+        outbox.start()
+        fsm_storage.start()
+        scheduler.start()
+
+        if settings.run_mode == "webhook":
+            from bot.webhook import run_webhook
+
+            await run_webhook(dp, bot, scheduler, broadcaster=broadcaster, outbox=outbox)
+        else:
+            # Запускаем polling; пока очередь обновлений полна, новые не запрашиваем
+            bot.session.middleware(scheduler.hold_updates)
+            await dp.start_polling(bot, skip_updates=True, broadcaster=broadcaster, outbox=outbox)
 
     except Exception as e:
         print(f"\n❌ КРИТИЧЕСКАЯ ОШИБКА: {e}")
@@ -778,6 +822,8 @@ async def main() -> None:
         print("2. Проверьте токен бота в @BotFather")
         print("3. Установите библиотеку: pip install aiohttp-socks")
         print("4. Перезапустите бота")
+    finally:
+        await close_services(broadcaster, outbox)
 
 
 if __name__ == "__main__":
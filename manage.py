@@ -0,0 +1,54 @@
+"""
+Служебные команды бота.
+
+Примеры:
+    python -m bot.manage backfill-rollup
+    python -m bot.manage add-category plank "Планка (сек)" --button "🧘 Планка"
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import db
+
+
+def backfill_rollup(_: argparse.Namespace) -> None:
+    db.init_db()
+    rows = db.backfill_daily_rollup()
+    print(f"✅ Сводка activity_daily пересчитана: {rows} строк")
+
+
+def add_category(args: argparse.Namespace) -> None:
+    # Ключ входит в callback_data ("period:<key>:<period>"), а она ограничена 64 байтами
+    if ":" in args.key or len(args.key.encode()) > 32:
+        raise SystemExit("Ключ категории — не длиннее 32 байт и без двоеточий")
+    db.init_db()
+    category_id = db.add_category(
+        args.key, args.label, args.button or args.label, args.rating_button or args.button or args.label
+    )
+    print(f"✅ Категория {args.key} добавлена (id {category_id}), перезапустите бота")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Служебные команды бота")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "backfill-rollup", help="Пересчитать дневную сводку по всей истории активностей"
+    ).set_defaults(handler=backfill_rollup)
+    category = commands.add_parser("add-category", help="Добавить категорию активностей")
+    category.add_argument("key", help="Ключ латиницей, например plank")
+    category.add_argument("label", help="Название в статистике и рейтингах")
+    category.add_argument("--button", help="Текст кнопки записи")
+    category.add_argument("--rating-button", help="Текст кнопки рейтинга")
+    category.set_defaults(handler=add_category)
+    args = parser.parse_args()
+    try:
+        args.handler(args)
+    finally:
+        db.close_connections()
+
+
+if __name__ == "__main__":
+    main()
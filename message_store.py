@@ -0,0 +1,104 @@
+"""
+Хранилище id последнего сообщения бота в каждом чате для send_compact.
+
+В памяти держится ограниченный LRU, изменения пачками сохраняются в
+таблицу last_messages, поэтому редактирование «на месте» переживает
+перезапуск, а память не растет вместе с числом пользователей. Пока база
+недоступна, несохраненных id копится не больше max_pending: самые старые
+забываются, и в их чатах бот пришлет новое сообщение вместо правки.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from bot import async_db
+from bot.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class MessageIdStore:
+    def __init__(self, maxsize: int = 50000, flush_interval: float = 1.0, max_dirty: int = 500) -> None:
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.max_pending = max(maxsize, max_dirty)
+        self._cache: TTLCache[int, Optional[int]] = TTLCache(maxsize=maxsize)
+        self._dirty: Dict[int, int] = {}
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._failing = False
+
+    async def get(self, chat_id: int) -> Optional[int]:
+        if chat_id in self._dirty:
+            return self._dirty[chat_id]
+        cached = self._cache.get(chat_id, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        stamp = self._cache.stamp
+        message_id = await async_db.get_last_message_id(chat_id)
+        if chat_id not in self._dirty:
+            self._cache.set(chat_id, message_id, stamp=stamp)
+        return message_id
+
+    def set(self, chat_id: int, message_id: int) -> None:
+        self._cache.set(chat_id, message_id)
+        # Переставляем в конец: при переполнении забываются давно не менявшиеся чаты
+        self._dirty.pop(chat_id, None)
+        self._dirty[chat_id] = message_id
+        self._trim()
+        # После ошибки сохранения ждем повтора по таймеру, а не сбрасываем на каждом set
+        if len(self._dirty) >= self.max_dirty and not self._failing:
+            self._schedule(0)
+        else:
+            self._schedule(self.flush_interval)
+
+    def _trim(self) -> None:
+        excess = len(self._dirty) - self.max_pending
+        if excess <= 0:
+            return
+        for chat_id in list(self._dirty)[:excess]:
+            del self._dirty[chat_id]
+        logger.warning("Несохраненных id сообщений больше %s, забыто: %s", self.max_pending, excess)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None:
+            if delay > 0:
+                return
+            self._timer.cancel()
+        self._timer = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as exc:
+            self._failing = True
+            logger.error("Не удалось сохранить id сообщений: %s", exc)
+            self._schedule(self.flush_interval)
+        else:
+            self._failing = False
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch = self._dirty
+            self._dirty = {}
+            try:
+                await async_db.save_last_message_ids(list(batch.items()))
+            except Exception:
+                # Более свежие значения, записанные за время сохранения, важнее старых
+                for chat_id in self._dirty:
+                    batch.pop(chat_id, None)
+                self._dirty = {**batch, **self._dirty}
+                self._trim()
+                raise
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
@@ -0,0 +1,378 @@
+"""
+Версионные миграции схемы.
+
+Новую базу init_db создает сразу в текущей схеме (create_schema) и
+отмечает все шаги примененными. В существующей базе migrate применяет по
+порядку шаги из MIGRATIONS, которых еще нет в schema_version.
+Каждый шаг вместе с записью в schema_version выполняется в отдельной явной
+транзакции: при ошибке шаг откатывается целиком (включая CREATE/DROP) и
+база остается на последней успешно примененной версии. Новый шаг
+добавляется в конец списка со следующим номером, а create_schema
+обновляется до схемы после него.
+"""
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Tuple
+
+Migration = Tuple[int, str, Callable[[sqlite3.Connection], None]]
+
+# Текущее время в секундах Unix для DEFAULT (unixepoch() есть только с SQLite 3.38)
+EPOCH_NOW = "(CAST(strftime('%s', 'now') AS INTEGER))"
+
+
+def _epoch(column: str) -> str:
+    # strftime понимает и datetime('now'), и isoformat() с 'T' и долями секунды;
+    # для NULL и нераспознанных строк результат — NULL
+    return f"CAST(strftime('%s', {column}) AS INTEGER)"
+
+
+def _activity_epoch(alias: str) -> str:
+    """
+    Время активности в секундах Unix. Нераспознанное время берется у
+    ближайшей предыдущей по id записи (id растут вместе со временем), а если
+    такой нет — текущее время.
+    """
+    return f"""COALESCE(
+        {_epoch(f"{alias}.created_at")},
+        (
+            SELECT {_epoch("p.created_at")} FROM activities p
+            WHERE p.id < {alias}.id AND {_epoch("p.created_at")} IS NOT NULL
+            ORDER BY p.id DESC LIMIT 1
+        ),
+        {EPOCH_NOW}
+    )"""
+
+
+def _integer_timestamps(conn: sqlite3.Connection) -> None:
+    """created_at и last_activity_at — целые секунды Unix вместо ISO-строк разного вида."""
+    conn.execute(
+        f"""
+        CREATE TABLE users_new (
+            user_id INTEGER PRIMARY KEY,
+            full_name TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            city TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_at INTEGER NOT NULL DEFAULT {EPOCH_NOW},
+            last_activity_at INTEGER
+        )
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO users_new
+        SELECT user_id, full_name, phone, city, age, status,
+               COALESCE({_epoch("created_at")}, {EPOCH_NOW}), {_epoch("last_activity_at")}
+        FROM users
+        """
+    )
+    conn.execute("DROP TABLE users")
+    conn.execute("ALTER TABLE users_new RENAME TO users")
+    conn.execute(
+        "CREATE INDEX idx_users_status_created ON users (status, created_at, user_id)"
+    )
+
+    conn.execute(
+        f"""
+        CREATE TABLE activities_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            value REAL NOT NULL,
+            created_at INTEGER NOT NULL DEFAULT {EPOCH_NOW},
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO activities_new (id, user_id, category, value, created_at)
+        SELECT a.id, a.user_id, a.category, a.value, {_activity_epoch("a")}
+        FROM activities a
+        """
+    )
+    conn.execute("DROP TABLE activities")
+    conn.execute("ALTER TABLE activities_new RENAME TO activities")
+    # Оба индекса покрывающие: суммы за неполный день читаются без обращения к таблице
+    conn.execute(
+        """
+        CREATE INDEX idx_activities_user_category
+        ON activities (user_id, category, created_at, value)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX idx_activities_category_created
+        ON activities (category, created_at, user_id, value)
+        """
+    )
+
+
+DEFAULT_CATEGORIES = [
+    ("pushups", "Отжимания", "💪 Отжимания", "💪 Отжимания"),
+    ("squats", "Приседания", "🏋️ Приседания", "🏋️ Приседания"),
+    ("pullups", "Подтягивания", "🧗 Подтягивания", "🧗 Подтягивания"),
+    ("running", "Бег", "🏃‍♂️ Бег (км)", "🏃‍♂️ Бег"),
+    ("reading", "Прочитанные страницы", "📚 Прочитано", "📚 Чтение"),
+]
+
+
+def _category_ids(conn: sqlite3.Connection) -> None:
+    """Справочник categories; activities и activity_daily хранят category_id вместо строки."""
+    # Исходный init_db сводку не создавал: заводим ее пустой, init_db заполнит по истории
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            day TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, category, day)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE categories (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            label TEXT NOT NULL,
+            activity_button TEXT NOT NULL,
+            rating_button TEXT NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.executemany(
+        """
+        INSERT INTO categories (key, label, activity_button, rating_button, position)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        [(*category, position) for position, category in enumerate(DEFAULT_CATEGORIES, start=1)],
+    )
+    # Категории, которых нет в списке по умолчанию, сохраняем как есть
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO categories (key, label, activity_button, rating_button, position)
+        SELECT category, category, category, category, 100
+        FROM (SELECT DISTINCT category FROM activities UNION SELECT DISTINCT category FROM activity_daily)
+        """
+    )
+
+    conn.execute(
+        f"""
+        CREATE TABLE activities_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            value REAL NOT NULL,
+            created_at INTEGER NOT NULL DEFAULT {EPOCH_NOW},
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            FOREIGN KEY (category_id) REFERENCES categories(id)
+        )
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO activities_new (id, user_id, category_id, value, created_at)
+        SELECT a.id, a.user_id, c.id, a.value, a.created_at
+        FROM activities a JOIN categories c ON c.key = a.category
+        """
+    )
+    conn.execute("DROP TABLE activities")
+    conn.execute("ALTER TABLE activities_new RENAME TO activities")
+    conn.execute(
+        """
+        CREATE INDEX idx_activities_user_category
+        ON activities (user_id, category_id, created_at, value)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX idx_activities_category_created
+        ON activities (category_id, created_at, user_id, value)
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE TABLE activity_daily_new (
+            user_id INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, category_id, day)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO activity_daily_new (user_id, category_id, day, total)
+        SELECT d.user_id, c.id, d.day, d.total
+        FROM activity_daily d JOIN categories c ON c.key = d.category
+        """
+    )
+    conn.execute("DROP TABLE activity_daily")
+    conn.execute("ALTER TABLE activity_daily_new RENAME TO activity_daily")
+    conn.execute(
+        """
+        CREATE INDEX idx_activity_daily_category_day
+        ON activity_daily (category_id, day, user_id, total)
+        """
+    )
+
+
+def _users_status_index(conn: sqlite3.Connection) -> None:
+    """Индекс для прохода по пользователям статуса в порядке user_id (db.iter_users)."""
+    conn.execute("CREATE INDEX idx_users_status_user ON users (status, user_id)")
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "integer timestamps and covering indexes", _integer_timestamps),
+    (2, "category ids", _category_ids),
+    (3, "users by status and id", _users_status_index),
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def _create_version_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at INTEGER NOT NULL
+        )
+        """
+    )
+
+
+def _record_version(conn: sqlite3.Connection, version: int, name: str) -> None:
+    conn.execute(
+        "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+        (version, name, int(time.time())),
+    )
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection) -> Iterator[None]:
+    # sqlite3 сам не открывает транзакцию перед DDL: фиксируем то, что было
+    # до нее, и управляем транзакцией явно
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def create_schema(conn: sqlite3.Connection) -> None:
+    """
+    Таблицы, которые меняют миграции, в текущем виде — для новой базы. Все
+    шаги MIGRATIONS отмечаются примененными в той же транзакции.
+    """
+    with _transaction(conn):
+        conn.execute(
+            f"""
+            CREATE TABLE users (
+                user_id INTEGER PRIMARY KEY,
+                full_name TEXT NOT NULL,
+                phone TEXT NOT NULL,
+                city TEXT NOT NULL,
+                age INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at INTEGER NOT NULL DEFAULT {EPOCH_NOW},
+                last_activity_at INTEGER
+            )
+            """
+        )
+        conn.execute("CREATE INDEX idx_users_status_created ON users (status, created_at, user_id)")
+        conn.execute("CREATE INDEX idx_users_status_user ON users (status, user_id)")
+        conn.execute(
+            """
+            CREATE TABLE categories (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                label TEXT NOT NULL,
+                activity_button TEXT NOT NULL,
+                rating_button TEXT NOT NULL,
+                position INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        conn.executemany(
+            """
+            INSERT INTO categories (key, label, activity_button, rating_button, position)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(*category, position) for position, category in enumerate(DEFAULT_CATEGORIES, start=1)],
+        )
+        conn.execute(
+            f"""
+            CREATE TABLE activities (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                category_id INTEGER NOT NULL,
+                value REAL NOT NULL,
+                created_at INTEGER NOT NULL DEFAULT {EPOCH_NOW},
+                FOREIGN KEY (user_id) REFERENCES users(user_id),
+                FOREIGN KEY (category_id) REFERENCES categories(id)
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE INDEX idx_activities_user_category
+            ON activities (user_id, category_id, created_at, value)
+            """
+        )
+        conn.execute(
+            """
+            CREATE INDEX idx_activities_category_created
+            ON activities (category_id, created_at, user_id, value)
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE activity_daily (
+                user_id INTEGER NOT NULL,
+                category_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                total REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, category_id, day)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute(
+            """
+            CREATE INDEX idx_activity_daily_category_day
+            ON activity_daily (category_id, day, user_id, total)
+            """
+        )
+        _create_version_table(conn)
+        for version, name, _ in MIGRATIONS:
+            _record_version(conn, version, name)
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """Применяет недостающие миграции и возвращает их номера."""
+    _create_version_table(conn)
+    current = schema_version(conn)
+    applied = []
+    for version, name, step in sorted(MIGRATIONS, key=lambda migration: migration[0]):
+        if version <= current:
+            continue
+        with _transaction(conn):
+            step(conn)
+            _record_version(conn, version, name)
+        applied.append(version)
+    return applied
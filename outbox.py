@@ -0,0 +1,176 @@
+"""
+Очередь уведомлений (outbox) для админов и пользователей.
+
+Обработчики только записывают уведомление в таблицу notification_outbox
+и сразу отвечают. Фоновый диспетчер отправляет уведомления параллельно,
+повторяет неудачные попытки с задержкой, а dedup_key не дает одному и
+тому же уведомлению уйти дважды. Перед отправкой строка переводится в
+status='sending': новое уведомление с тем же dedup_key, поставленное во
+время отправки, не затирает ее, а уходит следом.
+
+При запуске в несколько процессов очередь воркера забирает только
+уведомления чатов своего шарда (chat_id % shards == shard, как при раздаче
+обновлений): send_compact обновляет message_id в кэше того же процесса,
+который обрабатывает сообщения этого чата.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional, Set
+
+from aiogram import Bot, types
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from bot import async_db
+from bot.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+CompactSender = Callable[..., Awaitable[None]]
+
+
+def dump_markup(reply_markup: Any) -> Optional[str]:
+    if reply_markup is None:
+        return None
+    return json.dumps(
+        {
+            "type": type(reply_markup).__name__,
+            "data": reply_markup.model_dump(mode="json", exclude_none=True),
+        }
+    )
+
+
+def load_markup(raw: Optional[str]) -> Any:
+    if not raw:
+        return None
+    payload = json.loads(raw)
+    return getattr(types, payload["type"]).model_validate(payload["data"])
+
+
+class NotificationOutbox:
+    BATCH_SIZE = 50
+    IDLE_INTERVAL = 5.0
+
+    def __init__(
+        self,
+        bot: Bot,
+        bucket: TokenBucket,
+        send_compact: CompactSender,
+        concurrency: int = 5,
+        max_attempts: int = 8,
+        shard: int = 0,
+        shards: int = 1,
+    ) -> None:
+        self.bot = bot
+        self.bucket = bucket
+        self.send_compact = send_compact
+        self.max_attempts = max_attempts
+        self.shard = shard
+        self.shards = shards
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._in_flight: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def enqueue(
+        self,
+        chat_id: int,
+        text: str,
+        reply_markup: Any = None,
+        dedup_key: Optional[str] = None,
+        compact: bool = False,
+    ) -> None:
+        """compact=True — отправить через send_compact, отредактировав последнее сообщение чата."""
+        await async_db.enqueue_notification(
+            chat_id, text, dump_markup(reply_markup), compact, dedup_key, time.time()
+        )
+        self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        workers: Set[asyncio.Task] = set()
+        try:
+            # Уведомления, которые отправлялись при прошлой остановке, — снова в очередь
+            try:
+                await async_db.release_claimed_notifications(self.shard, self.shards)
+            except Exception as exc:
+                logger.error("Не удалось вернуть в очередь незавершенные уведомления: %s", exc)
+            while True:
+                self._wakeup.clear()
+                try:
+                    due = await async_db.claim_notifications(
+                        time.time(), self.BATCH_SIZE, self.shard, self.shards
+                    )
+                except Exception as exc:
+                    logger.error("Не удалось прочитать очередь уведомлений: %s", exc)
+                    due = []
+                for row in due:
+                    self._in_flight.add(row["id"])
+                    task = asyncio.create_task(self._deliver(row))
+                    workers.add(task)
+                    task.add_done_callback(workers.discard)
+                await self._sleep_until_due()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _sleep_until_due(self) -> None:
+        timeout = self.IDLE_INTERVAL
+        # Пока есть уведомления в работе, нас разбудит их завершение
+        if not self._in_flight:
+            try:
+                next_at = await async_db.get_next_notification_time(self.shard, self.shards)
+            except Exception:
+                next_at = None
+            if next_at is not None:
+                timeout = max(0.0, min(timeout, next_at - time.time()))
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _deliver(self, row) -> None:
+        attempts = row["attempts"] + 1
+        try:
+            async with self._semaphore:
+                await self.bucket.acquire()
+                try:
+                    reply_markup = load_markup(row["reply_markup"])
+                    if row["compact"]:
+                        await self.send_compact(self.bot, row["chat_id"], row["text"], reply_markup=reply_markup)
+                    else:
+                        await self.bot.send_message(row["chat_id"], row["text"], reply_markup=reply_markup)
+                except TelegramRetryAfter as exc:
+                    # Ограничение скорости, а не ошибка доставки: попытку не засчитываем
+                    self.bucket.pause(exc.retry_after)
+                    result = (row["id"], "pending", row["attempts"], time.time() + exc.retry_after, str(exc))
+                except (TelegramForbiddenError, TelegramBadRequest) as exc:
+                    logger.error("Не удалось отправить уведомление %s: %s", row["chat_id"], exc)
+                    result = (row["id"], "failed", attempts, time.time(), str(exc))
+                except Exception as exc:
+                    result = self._retry(row, attempts, str(exc) or type(exc).__name__)
+                else:
+                    result = (row["id"], "sent", attempts, time.time(), None)
+            await async_db.complete_notifications([result])
+        finally:
+            self._in_flight.discard(row["id"])
+            self._wakeup.set()
+
+    def _retry(self, row, attempts: int, error: str):
+        if attempts >= self.max_attempts:
+            logger.error("Уведомление %s не доставлено после %s попыток: %s", row["chat_id"], attempts, error)
+            return row["id"], "failed", attempts, time.time(), error
+        delay = min(300.0, 2 ** attempts) + random.random()
+        return row["id"], "pending", attempts, time.time() + delay, error
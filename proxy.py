@@ -0,0 +1,489 @@
+import asyncio
+import importlib.util
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Mapping, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.base import BaseSession
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError
+from aiogram.methods import GetMe, GetUpdates, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import User
+
+from bot import async_db
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ключ в таблице bot_state с последним рабочим прокси и его задержкой
+LAST_PROXY_KEY = "last_good_proxy"
+
+# Список публичных прокси-серверов в разных странах
+# Эти серверы находятся за пределами России и обходят блокировку
+PROXY_SERVERS = [
+    # 🇺🇸 США
+    {"url": "socks5://45.77.56.114:9050", "country": "США", "city": "Нью-Йорк"},
+    {"url": "socks5://138.197.157.60:9050", "country": "США", "city": "Сан-Франциско"},
+    {"url": "socks5://209.97.150.167:9050", "country": "США", "city": "Чикаго"},
+
+    # 🇩🇪 Германия
+    {"url": "socks5://185.199.229.156:7492", "country": "Германия", "city": "Франкфурт"},
+    {"url": "socks5://188.166.216.198:9050", "country": "Германия", "city": "Берлин"},
+
+    # 🇳🇱 Нидерланды
+    {"url": "socks5://178.62.193.19:9050", "country": "Нидерланды", "city": "Амстердам"},
+
+    # 🇸🇬 Сингапур
+    {"url": "socks5://128.199.202.122:9050", "country": "Сингапур", "city": "Сингапур"},
+
+    # 🇯🇵 Япония
+    {"url": "socks5://45.32.234.150:9050", "country": "Япония", "city": "Токио"},
+
+    # 🇫🇷 Франция
+    {"url": "socks5://51.158.68.133:8811", "country": "Франция", "city": "Париж"},
+
+    # 🇬🇧 Великобритания
+    {"url": "socks5://51.15.122.122:9050", "country": "Великобритания", "city": "Лондон"},
+
+    # 🇨🇦 Канада
+    {"url": "socks5://159.203.87.129:9050", "country": "Канада", "city": "Торонто"},
+]
+
+
+class TunedAiohttpSession(AiohttpSession):
+    """AiohttpSession с настроенным keep-alive пулом соединений коннектора."""
+
+    def __init__(
+        self,
+        proxy: Optional[str] = None,
+        limit: int = 100,
+        keepalive_timeout: float = 30.0,
+        **kwargs: Any,
+    ) -> None:
+        # Задаем до super().__init__: там уже вызывается _setup_proxy_connector
+        self._pool_options: Dict[str, Any] = {"limit": limit, "keepalive_timeout": keepalive_timeout}
+        super().__init__(proxy=proxy, **kwargs)
+        # aiogram передает эти параметры в конструктор коннектора при создании сессии
+        self._connector_init.update(self._pool_options)
+
+    def _setup_proxy_connector(self, proxy: Any) -> None:
+        # Смена прокси пересобирает _connector_init — возвращаем настройки пула
+        super()._setup_proxy_connector(proxy)
+        self._connector_init.update(self._pool_options)
+
+
+def make_session(proxy_url: Optional[str]) -> TunedAiohttpSession:
+    return TunedAiohttpSession(
+        proxy=proxy_url,
+        limit=settings.proxy_connection_limit,
+        keepalive_timeout=settings.proxy_keepalive_timeout,
+    )
+
+
+@dataclass
+class ProbeResult:
+    proxy: Dict[str, str]
+    latency: Optional[float] = None
+    error: Optional[str] = None
+    bot: Optional[Bot] = None
+    me: Optional[User] = None
+
+
+def describe_error(error: str) -> str:
+    if "timeout" in error.lower():
+        return "⏰ Таймаут соединения"
+    if "connection refused" in error.lower():
+        return "🔌 Соединение отклонено"
+    return f"❌ Ошибка: {error[:50]}..."
+
+
+async def probe_proxy(token: str, proxy: Dict[str, str], timeout: float) -> ProbeResult:
+    """Проверяет прокси запросом get_me и измеряет задержку."""
+    session: Optional[TunedAiohttpSession] = None
+    started = time.monotonic()
+    try:
+        # Сессия создается внутри try: ошибка в настройках одного прокси — это неудачная проверка
+        session = make_session(proxy["url"])
+        bot = Bot(token=token, parse_mode=ParseMode.HTML, session=session)
+        me = await bot.get_me(request_timeout=int(timeout))
+    except asyncio.CancelledError:
+        if session is not None:
+            await session.close()
+        raise
+    except Exception as exc:
+        if session is not None:
+            await session.close()
+        return ProbeResult(proxy=proxy, error=str(exc) or type(exc).__name__)
+    return ProbeResult(proxy=proxy, latency=time.monotonic() - started, bot=bot, me=me)
+
+
+async def race_proxies(
+    token: str,
+    proxies: List[Dict[str, str]],
+    concurrency: int,
+    timeout: float,
+    grace: float,
+) -> Tuple[Optional[ProbeResult], List[ProbeResult]]:
+    """
+    Проверяет прокси одновременно (не более concurrency за раз). После
+    первого успеха ждет еще grace секунд, чтобы успели ответить более
+    быстрые прокси, запущенные позже, и выбирает прокси с наименьшей
+    задержкой. Сессии всех ответивших прокси остаются открытыми: их
+    забирает в пул build_pool.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def guarded(proxy: Dict[str, str]) -> ProbeResult:
+        async with semaphore:
+            return await probe_proxy(token, proxy, timeout)
+
+    loop = asyncio.get_running_loop()
+    pending = {asyncio.create_task(guarded(proxy)) for proxy in proxies}
+    results: List[ProbeResult] = []
+    deadline: Optional[float] = None
+    while pending:
+        wait_for = None if deadline is None else max(0.0, deadline - loop.time())
+        done, pending = await asyncio.wait(
+            pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not done:
+            break
+        for task in done:
+            result = task.result()
+            results.append(result)
+            place = f"{result.proxy['country']} ({result.proxy['city']})"
+            if result.bot is not None:
+                print(f"   ✅ {place}: {result.latency * 1000:.0f} мс")
+                if deadline is None:
+                    deadline = loop.time() + grace
+            else:
+                print(f"   {describe_error(result.error or '')} — {place}")
+
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    healthy = [result for result in results if result.bot is not None]
+    best = min(healthy, key=lambda result: result.latency) if healthy else None
+    return best, results
+
+
+@dataclass
+class PoolMember:
+    proxy: Dict[str, str]
+    session: AiohttpSession
+    latency: Optional[float] = None
+    failures: int = 0
+    requests: int = 0
+    errors: int = 0
+    last_error: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.proxy['country']} ({self.proxy['city']})"
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        self.requests += 1
+        self.failures = 0
+        if latency is not None:
+            # Экспоненциальное сглаживание, чтобы один медленный ответ не переключал прокси
+            self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+
+    def record_failure(self, error: str) -> None:
+        self.requests += 1
+        self.errors += 1
+        self.failures += 1
+        self.last_error = error
+
+
+class ProxyPoolSession(BaseSession):
+    """
+    Сессия бота поверх нескольких прокси. Для каждого прокси копится
+    статистика задержек и ошибок, фоновая проверка get_me обновляет ее,
+    а новые запросы уходят через лучший здоровый прокси. Запросы, уже
+    начатые через старый прокси, завершаются на нем же.
+    """
+
+    # Переключаемся на более быстрый прокси, только если он заметно быстрее текущего
+    SWITCH_RATIO = 0.7
+    # Эти методы безопасно повторить через другой прокси после сетевой ошибки
+    RETRY_SAFE = (GetMe, GetUpdates)
+
+    def __init__(
+        self,
+        members: List[PoolMember],
+        failure_threshold: int = 3,
+        health_interval: float = 60.0,
+        on_switch: Optional[Callable[[PoolMember], Awaitable[None]]] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        if not members:
+            raise ValueError("Пул прокси не может быть пустым")
+        self.members = members
+        self.failure_threshold = failure_threshold
+        self.health_interval = health_interval
+        self.current = min(members, key=self._rank)
+        self.on_switch = on_switch
+        self._bot: Optional[Bot] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+
+    def _healthy(self, member: PoolMember) -> bool:
+        return member.failures < self.failure_threshold
+
+    def _rank(self, member: PoolMember) -> Tuple[bool, float]:
+        latency = member.latency if member.latency is not None else float("inf")
+        return (not self._healthy(member), latency)
+
+    def _choose(self, exclude: Tuple[PoolMember, ...] = ()) -> Optional[PoolMember]:
+        candidates = [member for member in self.members if member not in exclude]
+        if not candidates:
+            return None
+        best = min(candidates, key=self._rank)
+        current = self.current
+        if current in candidates and self._healthy(current):
+            faster = (
+                best.latency is not None
+                and current.latency is not None
+                and best.latency < current.latency * self.SWITCH_RATIO
+            )
+            if not faster:
+                return current
+        if best is not current and not exclude:
+            logger.warning(
+                "Переключаемся на прокси %s (%s): %s",
+                best.label,
+                best.proxy["url"],
+                "текущий недоступен" if not self._healthy(current) else "он быстрее",
+            )
+            self.current = best
+            if self.on_switch is not None:
+                task = asyncio.create_task(self.on_switch(best))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+        return best
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None
+    ) -> TelegramType:
+        self._bot = bot
+        tried: Tuple[PoolMember, ...] = ()
+        while True:
+            member = self._choose(tried)
+            started = time.monotonic()
+            try:
+                result = await member.session.make_request(bot, method, timeout=timeout)
+            except TelegramNetworkError as exc:
+                member.record_failure(str(exc))
+                tried += (member,)
+                retry = isinstance(method, self.RETRY_SAFE) and any(
+                    self._healthy(other) for other in self.members if other not in tried
+                )
+                if not retry:
+                    raise
+                logger.warning("Прокси %s не ответил, повторяем запрос через другой", member.label)
+                continue
+            except TelegramAPIError:
+                # Telegram ответил ошибкой — сам прокси при этом работает
+                member.record_success()
+                raise
+            # getUpdates — долгий опрос, его длительность не говорит о задержке прокси
+            member.record_success(None if isinstance(method, GetUpdates) else time.monotonic() - started)
+            return result
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: Optional[Dict[str, Any]] = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True,
+    ) -> AsyncGenerator[bytes, None]:
+        async for chunk in self._choose().session.stream_content(
+            url=url,
+            headers=headers,
+            timeout=timeout,
+            chunk_size=chunk_size,
+            raise_for_status=raise_for_status,
+        ):
+            yield chunk
+
+    def start_health_checks(self, bot: Bot, immediate: bool = False) -> None:
+        self._bot = bot
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop(immediate))
+
+    async def _health_loop(self, immediate: bool) -> None:
+        if not immediate:
+            await asyncio.sleep(self.health_interval)
+        while True:
+            await asyncio.gather(*(self._probe(member) for member in self.members))
+            self._choose()
+            await asyncio.sleep(self.health_interval)
+
+    async def _probe(self, member: PoolMember) -> None:
+        started = time.monotonic()
+        try:
+            await member.session.make_request(self._bot, GetMe(), timeout=10)
+        except Exception as exc:
+            member.record_failure(str(exc) or type(exc).__name__)
+        else:
+            member.record_success(time.monotonic() - started)
+
+    def stats(self) -> List[Mapping[str, Any]]:
+        return [
+            {
+                "proxy": member.proxy["url"],
+                "current": member is self.current,
+                "healthy": self._healthy(member),
+                "latency_ms": round(member.latency * 1000) if member.latency is not None else None,
+                "requests": member.requests,
+                "errors": member.errors,
+                "last_error": member.last_error,
+            }
+            for member in self.members
+        ]
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        for member in self.members:
+            await member.session.close()
+
+
+def build_pool(results: List[ProbeResult]) -> ProxyPoolSession:
+    members = []
+    for result in results:
+        if result.bot is not None:
+            members.append(PoolMember(result.proxy, result.bot.session, latency=result.latency))
+        else:
+            try:
+                session = make_session(result.proxy["url"])
+            except Exception as exc:
+                logger.warning("Прокси %s пропущен: %s", result.proxy["url"], exc)
+                continue
+            members.append(
+                PoolMember(
+                    result.proxy,
+                    session,
+                    failures=settings.proxy_failure_threshold,
+                    last_error=result.error,
+                )
+            )
+    return ProxyPoolSession(
+        members,
+        failure_threshold=settings.proxy_failure_threshold,
+        health_interval=settings.proxy_health_interval,
+        on_switch=lambda member: save_last_proxy(member.proxy, member.latency),
+    )
+
+
+async def load_last_proxy() -> Optional[Dict[str, Any]]:
+    try:
+        raw = await async_db.get_bot_state(LAST_PROXY_KEY)
+        return json.loads(raw) if raw else None
+    except Exception as exc:
+        logger.warning("Не удалось прочитать последний рабочий прокси: %s", exc)
+        return None
+
+
+async def save_last_proxy(proxy: Dict[str, str], latency: Optional[float]) -> None:
+    try:
+        await async_db.set_bot_state(
+            LAST_PROXY_KEY, json.dumps({"url": proxy["url"], "latency": latency})
+        )
+    except Exception as exc:
+        logger.warning("Не удалось сохранить рабочий прокси: %s", exc)
+
+
+# ==================== ФУНКЦИЯ СОЗДАНИЯ БОТА С ПРОКСИ ====================
+async def create_bot_with_proxy(token: str) -> Bot:
+    """
+    Автоматически подбирает рабочий прокси-сервер за границей
+    для обхода блокировки Telegram в России
+    """
+    print("=" * 60)
+    print("🌍 ПОИСК РАБОЧЕГО ПРОКСИ-СЕРВЕРА ЗА ГРАНИЦЕЙ")
+    print("=" * 60)
+
+    proxies = list(PROXY_SERVERS)
+    # Перемешиваем список, чтобы при ограниченном параллелизме первыми проверялись разные прокси
+    random.shuffle(proxies)
+
+    best: Optional[ProbeResult] = None
+    results: List[ProbeResult] = []
+    # Проверяем наличие без импорта: сам aiohttp_socks загрузится вместе с первым коннектором
+    if importlib.util.find_spec("aiohttp_socks") is None:
+        print("❌ Библиотека aiohttp-socks не установлена!")
+        print("   Установите: pip install aiohttp-socks")
+    else:
+        last = await load_last_proxy()
+        known = next((proxy for proxy in proxies if last and proxy["url"] == last.get("url")), None)
+        if known is not None:
+            print(f"⚡ Пробуем последний рабочий прокси: {known['country']} ({known['city']})")
+            last_latency = last.get("latency") or 1.0
+            timeout = min(settings.proxy_probe_timeout, max(3.0, last_latency * 10))
+            result = await probe_proxy(token, known, timeout)
+            results.append(result)
+            if result.bot is not None:
+                best = result
+            else:
+                print(f"   {describe_error(result.error or '')}, запускаем полный поиск")
+        if best is None:
+            candidates = [proxy for proxy in proxies if proxy is not known]
+            print(
+                f"🔄 Проверяем {len(candidates)} прокси одновременно "
+                f"(не более {settings.proxy_probe_concurrency} за раз)"
+            )
+            best, raced = await race_proxies(
+                token,
+                candidates,
+                concurrency=settings.proxy_probe_concurrency,
+                timeout=settings.proxy_probe_timeout,
+                grace=settings.proxy_probe_grace,
+            )
+            results += raced
+
+    if best is not None:
+        proxy = best.proxy
+        print(f"✅ УСПЕХ! Рабочий прокси в {proxy['country']} ({best.latency * 1000:.0f} мс)!")
+        print(f"   📡 Подключение через: {proxy['url']}")
+        print(f"   🤖 Бот: @{best.me.username} (ID: {best.me.id})")
+        # Не успевшие ответить прокси тоже попадают в пул: фоновая проверка вернет их в работу
+        probed = {result.proxy["url"] for result in results}
+        unprobed = [candidate for candidate in proxies if candidate["url"] not in probed]
+        results += [ProbeResult(proxy=candidate, error="не проверен") for candidate in unprobed]
+        pool = build_pool(results)
+        bot_instance = Bot(token=token, parse_mode=ParseMode.HTML, session=pool)
+        await save_last_proxy(proxy, best.latency)
+        # При быстром старте остальные прокси еще не проверены — проверяем их сразу в фоне
+        pool.start_health_checks(bot_instance, immediate=bool(unprobed))
+        print(f"   🔁 В пуле {len(pool.members)} прокси, проверка каждые {pool.health_interval:.0f} с")
+        print("=" * 60)
+        return bot_instance
+
+    # Если ни один прокси не сработал
+    print("⚠️ ВНИМАНИЕ: Ни один прокси не сработал!")
+    print("   Пробуем прямое подключение (требуется VPN)...")
+    print("=" * 60)
+
+    # Пробуем создать бота без прокси (требуется VPN)
+    try:
+        bot_instance = Bot(token=token, parse_mode=ParseMode.HTML)
+        me = await bot_instance.get_me(request_timeout=15)
+        print(f"✅ Прямое подключение работает (VPN включен)")
+        print(f"   🤖 Бот: @{me.username}")
+        return bot_instance
+    except Exception as e:
+        print(f"❌ Прямое подключение тоже не работает: {e}")
+        print("   ВКЛЮЧИТЕ VPN и перезапустите бота!")
+        raise ConnectionError("Не удалось подключиться к Telegram API")
@@ -0,0 +1,77 @@
+"""
+Ограничение скорости отправки сообщений.
+
+Telegram пускает около 30 сообщений в секунду на бота и при превышении
+отвечает retry_after. Рассылка и очередь уведомлений берут токены из
+одного TokenBucket, поэтому вместе не превышают лимит, а retry_after
+останавливает обе. Воркеры bot.workers делят лимит через
+SharedRateLimiter.
+"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Общий ограничитель скорости отправки: rate токенов в секунду, не более
+    capacity подряд. pause() останавливает всех ожидающих, например на
+    время retry_after от Telegram.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        if rate <= 0:
+            raise ValueError(f"Скорость отправки должна быть положительной: {rate}")
+        self.rate = rate
+        # Меньше одного токена в запасе acquire() никогда бы не набрал
+        self.capacity = max(1.0, capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SharedRateLimiter:
+    """
+    Лимит rate сообщений/с, общий для нескольких процессов. В общей памяти
+    лежит время следующего свободного слота: acquire() занимает слот и
+    ждет его. Создается до запуска процессов из того же multiprocessing
+    context и передается им аргументом. Интерфейс как у TokenBucket.
+    """
+
+    def __init__(self, rate: float, context) -> None:
+        if rate <= 0:
+            raise ValueError(f"Скорость отправки должна быть положительной: {rate}")
+        self.rate = rate
+        # time.monotonic() в Linux общий для всех процессов машины
+        self._next_slot = context.Value("d", 0.0)
+
+    def pause(self, seconds: float) -> None:
+        with self._next_slot.get_lock():
+            self._next_slot.value = max(self._next_slot.value, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        with self._next_slot.get_lock():
+            now = time.monotonic()
+            slot = max(self._next_slot.value, now)
+            self._next_slot.value = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
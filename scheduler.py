@@ -0,0 +1,141 @@
+"""
+Планировщик обновлений: один чат — по порядку, разные чаты — параллельно.
+
+Подключается к Dispatcher как events_isolation: FSMContextMiddleware берет
+его lock() до того, как прочитать состояние для фильтров. Иначе состояние
+читается раньше, чем закончится обработка предыдущего сообщения того же
+чата, и два быстрых нажатия расходятся по разным веткам. Общее число
+одновременно работающих обработчиков ограничено concurrency, чтобы всплеск
+не исчерпал пул соединений к базе.
+
+Если в работе и в очереди max_pending обновлений, admit() задерживает
+прием новых: в polling — запрос getUpdates (см. hold_updates), в вебхуке —
+ответ Telegram, в воркерах — чтение из очереди процесса.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from aiogram.methods import GetUpdates, TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatSlot:
+    __slots__ = ("lock", "depth")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.depth = 0
+
+
+class UpdateScheduler(BaseEventIsolation):
+    def __init__(self, concurrency: int, max_pending: int, report_interval: float = 60.0) -> None:
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.report_interval = report_interval
+        self._report_task: Optional[asyncio.Task] = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._chats: Dict[int, _ChatSlot] = {}
+        self._room = asyncio.Event()
+        self._room.set()
+        self._saturated = False
+        self.pending = 0
+        self.running = 0
+        self.processed = 0
+        self.peak_pending = 0
+        self.peak_chat_depth = 0
+        self.wait_total = 0.0
+
+    async def admit(self) -> None:
+        """Ждет, пока в работе и в очереди меньше max_pending обновлений."""
+        while self.pending >= self.max_pending:
+            self._room.clear()
+            await self._room.wait()
+
+    async def hold_updates(
+        self,
+        make_request: Callable[[Bot, TelegramMethod[Any]], Awaitable[Any]],
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Any:
+        """Middleware сессии бота: в polling не запрашивает новые обновления, пока очередь полна."""
+        if isinstance(method, GetUpdates):
+            await self.admit()
+        return await make_request(bot, method)
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        chat_id = key.chat_id
+        slot = self._chats.get(chat_id)
+        if slot is None:
+            slot = self._chats[chat_id] = _ChatSlot()
+        slot.depth += 1
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        self.peak_chat_depth = max(self.peak_chat_depth, slot.depth)
+        if self.pending >= self.max_pending and not self._saturated:
+            self._saturated = True
+            logger.warning("Очередь обновлений заполнена: %s", self.pending)
+        queued_at = time.monotonic()
+        try:
+            async with slot.lock:
+                async with self._semaphore:
+                    self.wait_total += time.monotonic() - queued_at
+                    self.running += 1
+                    try:
+                        yield
+                    finally:
+                        self.running -= 1
+                        self.processed += 1
+        finally:
+            slot.depth -= 1
+            if not slot.depth:
+                del self._chats[chat_id]
+            self.pending -= 1
+            if self.pending < self.max_pending:
+                self._room.set()
+            if self.pending <= self.max_pending // 2:
+                self._saturated = False
+
+    async def close(self) -> None:
+        # Вызывается при остановке Dispatcher; отчет и счетчики завершает stop()
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "running": self.running,
+            "chats": len(self._chats),
+            "processed": self.processed,
+            "peak_pending": self.peak_pending,
+            "peak_chat_depth": self.peak_chat_depth,
+            "avg_wait_ms": round(self.wait_total / self.processed * 1000, 2) if self.processed else 0.0,
+        }
+
+    def start(self) -> None:
+        if self._report_task is None and self.report_interval > 0:
+            self._report_task = asyncio.create_task(self._report())
+
+    async def stop(self) -> None:
+        if self._report_task is not None:
+            self._report_task.cancel()
+            await asyncio.gather(self._report_task, return_exceptions=True)
+            self._report_task = None
+        logger.info("Планировщик обновлений: %s", self.stats())
+
+    async def _report(self) -> None:
+        processed = self.processed
+        while True:
+            await asyncio.sleep(self.report_interval)
+            if self.processed != processed or self.pending:
+                processed = self.processed
+                logger.info("Планировщик обновлений: %s, самые длинные очереди: %s", self.stats(), self.busiest_chats())
+
+    def busiest_chats(self, limit: int = 5) -> List[Tuple[int, int]]:
+        """(глубина, chat_id) чатов с самой длинной очередью."""
+        return sorted(((slot.depth, chat_id) for chat_id, slot in self._chats.items()), reverse=True)[:limit]
@@ -0,0 +1,88 @@
+"""
+Движок хранения поверх SQLite: один писатель и пул читателей.
+
+Писатель — единственное соединение, все записи выполняются в отдельном
+потоке по очереди. Читатели живут в своих потоках и не ждут писателя
+благодаря WAL.
+"""
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+
+class Storage:
+    def __init__(
+        self,
+        database_path: str,
+        readers: int = 4,
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_size_kib: int = 16 * 1024,
+        statement_cache: int = 256,
+    ) -> None:
+        self.database_path = database_path
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.statement_cache = statement_cache
+        self.writer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self.reader_executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.Lock()
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._generation = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.database_path,
+            check_same_thread=False,
+            cached_statements=self.statement_cache,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kib)}")
+        return conn
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+                self._writer.execute("PRAGMA journal_mode = WAL")
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "generation", None) != self._generation:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only = ON")
+            with self._readers_lock:
+                self._readers.append(conn)
+            self._local.conn = conn
+            self._local.generation = self._generation
+        yield conn
+
+    def close(self) -> None:
+        self.writer_executor.shutdown(wait=True)
+        self.reader_executor.shutdown(wait=True)
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._readers_lock:
+            readers = list(self._readers)
+            self._readers.clear()
+            self._generation += 1
+        for conn in readers:
+            conn.close()
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# bot.config читает окружение при импорте
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("ADMIN_IDS", "1")
+os.environ.setdefault("ADMIN_PHONES", "")
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="bot-tests-"), "bot.db"))
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from bot import async_db
+from bot.broadcast import Broadcaster
+from bot.ratelimit import TokenBucket
+
+
+class FlakyBot:
+    """send_message отвечает retry_after заданное число раз, затем успешно."""
+
+    def __init__(self, retry_after_times: int) -> None:
+        self.retry_after_times = retry_after_times
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        if self.calls <= self.retry_after_times:
+            raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text=text), "Too Many Requests", 0)
+
+
+def test_retry_after_does_not_count_as_attempt():
+    bot = FlakyBot(retry_after_times=7)
+    broadcaster = Broadcaster(bot, TokenBucket(1000, 1000), concurrency=1, max_attempts=3)
+    user_id, status, attempts, error = asyncio.run(broadcaster._deliver(42, "привет"))
+    assert (user_id, status, attempts, error) == (42, "sent", 8, None)
+
+
+def test_failed_flush_cancels_other_senders(monkeypatch):
+    async def scenario():
+        await async_db.init_db()
+        for user_id in range(700, 760):
+            await async_db.add_user(user_id, f"Получатель {user_id}", "+7", "Москва", 30)
+            await async_db.set_user_status(user_id, "approved")
+        job_id = await async_db.create_broadcast_job(1, "текст", ["approved"])
+
+        async def broken_save(job_id, batch):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(async_db, "save_broadcast_results", broken_save)
+        bot = FlakyBot(retry_after_times=0)
+        broadcaster = Broadcaster(bot, TokenBucket(1000, 1000), concurrency=4, max_attempts=3)
+        broadcaster.FLUSH_EVERY = 1
+        before = set(asyncio.all_tasks())
+        with pytest.raises(RuntimeError):
+            await broadcaster._run(job_id)
+        await asyncio.sleep(0)
+        leftover = set(asyncio.all_tasks()) - before
+        return bot.calls, leftover
+
+    calls, leftover = asyncio.run(scenario())
+    assert not leftover
+    assert calls < 60
+
+
+class AdminUnreachableBot(FlakyBot):
+    """Сообщение о прогрессе админу не уходит, получателям — уходит."""
+
+    def __init__(self, admin_chat_id: int) -> None:
+        super().__init__(retry_after_times=0)
+        self.admin_chat_id = admin_chat_id
+        self.recipients = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id == self.admin_chat_id:
+            raise RuntimeError("network down")
+        self.recipients.append(chat_id)
+
+
+def test_job_runs_when_progress_message_fails():
+    async def scenario():
+        await async_db.init_db()
+        for user_id in range(800, 805):
+            await async_db.add_user(user_id, f"Получатель {user_id}", "+7", "Москва", 30)
+            await async_db.set_user_status(user_id, "approved")
+        bot = AdminUnreachableBot(admin_chat_id=900)
+        broadcaster = Broadcaster(bot, TokenBucket(1000, 1000), concurrency=2, max_attempts=3)
+        with pytest.raises(RuntimeError):
+            await broadcaster.start(900, "текст", ["approved"])
+        (job_id,) = broadcaster._tasks
+        await broadcaster._tasks[job_id]
+        job = await async_db.get_broadcast_job(job_id)
+        return bot.recipients, job["status"]
+
+    recipients, status = asyncio.run(scenario())
+    assert set(range(800, 805)) <= set(recipients)
+    assert status != "running"
@@ -0,0 +1,64 @@
+import time
+
+from bot.cache import TTLCache
+
+
+def test_hits_and_misses_are_counted():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b", "нет") == "нет"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_values_expire_after_ttl():
+    cache = TTLCache(ttl=0.02)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.03)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_pop_discards_only_in_flight_value_of_its_key():
+    cache = TTLCache()
+    # Оба значения читаются из базы, пока другой обработчик меняет "b"
+    stamp = cache.stamp
+    cache.pop("b")
+    cache.set("a", "свежее", stamp=stamp)
+    cache.set("b", "устаревшее", stamp=stamp)
+    assert cache.get("a") == "свежее"
+    assert cache.get("b") is None
+    # Прочитанное после удаления сохраняется
+    cache.set("b", "новое", stamp=cache.stamp)
+    assert cache.get("b") == "новое"
+
+
+def test_invalidate_discards_all_in_flight_values():
+    cache = TTLCache()
+    stamp = cache.stamp
+    cache.invalidate(lambda key: key == "b")
+    cache.set("a", 1, stamp=stamp)
+    assert cache.get("a") is None
+
+
+def test_pop_marks_stay_bounded():
+    cache = TTLCache(maxsize=4)
+    stamp = cache.stamp
+    for key in range(10):
+        cache.pop(key)
+    assert len(cache._popped) <= 4
+    # Забытые метки не дают сохранить значение, прочитанное до удаления
+    cache.set(0, "устаревшее", stamp=stamp)
+    assert cache.get(0) is None
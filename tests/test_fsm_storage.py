@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+
+from bot import async_db, db
+from bot.fsm_storage import SQLiteStorage, make_key
+
+
+def storage_key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+def test_handler_writes_are_coalesced(monkeypatch):
+    saves = []
+    original = async_db.save_fsm_records
+
+    async def counting_save(upserts, deletes):
+        saves.append((upserts, deletes))
+        await original(upserts, deletes)
+
+    monkeypatch.setattr(async_db, "save_fsm_records", counting_save)
+
+    async def scenario():
+        await async_db.init_db()
+        storage = SQLiteStorage(flush_interval=0.02)
+        key = storage_key(1100)
+        await storage.set_state(key, "Registration:name")
+        await storage.set_data(key, {"name": "Иван"})
+        await storage.update_data(key, {"phone": "+7"})
+        assert not saves
+        await asyncio.sleep(0.1)
+        await storage.close()
+
+    asyncio.run(scenario())
+    assert len(saves) == 1
+    upserts, deletes = saves[0]
+    assert [(row[0], row[1]) for row in upserts] == [(make_key(storage_key(1100)), "Registration:name")]
+    assert not deletes
+
+
+def test_expired_states_are_dropped_and_swept():
+    async def scenario():
+        await async_db.init_db()
+        stale = time.time() - 7200
+        db.save_fsm_records(
+            [(make_key(storage_key(1200)), "Registration:age", "{}", stale)], []
+        )
+        storage = SQLiteStorage(ttl=3600)
+        # Брошенное состояние не восстанавливается, даже пока лежит в базе
+        state = await storage.get_state(storage_key(1200))
+
+        db.save_fsm_records(
+            [(make_key(storage_key(1201)), "Registration:city", "{}", stale)], []
+        )
+        await storage.set_state(storage_key(1202), "Registration:name")
+        # Запись в памяти, устаревшая уже после загрузки
+        (await storage._load(storage_key(1203))).updated_at = stale
+        storage.start()
+        await asyncio.sleep(0.05)
+        await storage.close()
+        return state, storage._records
+
+    state, records = asyncio.run(scenario())
+    assert state is None
+    assert db.get_fsm_record(make_key(storage_key(1201))) is None
+    assert db.get_fsm_record(make_key(storage_key(1202)))["state"] == "Registration:name"
+    assert make_key(storage_key(1203)) not in records
+
+
+def test_state_and_data_survive_restart():
+    key = storage_key(1300)
+
+    async def before_restart():
+        await async_db.init_db()
+        storage = SQLiteStorage()
+        await storage.set_state(key, "Activity:value")
+        await storage.set_data(key, {"category": 3})
+        await storage.close()
+
+    async def after_restart():
+        storage = SQLiteStorage()
+        return await storage.get_state(key), await storage.get_data(key)
+
+    asyncio.run(before_restart())
+    assert asyncio.run(after_restart()) == ("Activity:value", {"category": 3})
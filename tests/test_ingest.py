@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from bot import async_db, db
+from bot.ingest import ActivityBuffer
+
+
+class RecordingWriter:
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.batches = []
+
+    async def __call__(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        self.batches.append([(user_id, category, value) for user_id, category, value, _ in rows])
+
+
+def test_rows_are_flushed_after_the_delay():
+    async def scenario():
+        writer = RecordingWriter()
+        buffer = ActivityBuffer(writer, flush_interval=0.02, max_rows=100)
+        await buffer.add(1, "pushups", 10)
+        await buffer.add(2, "squats", 20)
+        before = list(writer.batches)
+        await asyncio.sleep(0.05)
+        return before, writer.batches
+
+    before, batches = asyncio.run(scenario())
+    assert before == []
+    assert batches == [[(1, "pushups", 10), (2, "squats", 20)]]
+
+
+def test_full_batch_is_flushed_at_max_rows():
+    async def scenario():
+        writer = RecordingWriter()
+        buffer = ActivityBuffer(writer, flush_interval=10, max_rows=3)
+        for value in range(4):
+            await buffer.add(1, "pushups", value)
+        batches = list(writer.batches)
+        await buffer.close()
+        return batches, writer.batches
+
+    at_max_rows, after_close = asyncio.run(scenario())
+    assert at_max_rows == [[(1, "pushups", 0), (1, "pushups", 1), (1, "pushups", 2)]]
+    assert after_close[1:] == [[(1, "pushups", 3)]]
+
+
+def test_failed_flush_requeues_rows_in_order():
+    async def scenario():
+        writer = RecordingWriter(failures=1)
+        buffer = ActivityBuffer(writer, flush_interval=0.02, max_rows=100)
+        await buffer.add(1, "pushups", 1)
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        await buffer.add(1, "pushups", 2)
+        # Повтор по таймеру, запущенному после ошибки
+        await asyncio.sleep(0.05)
+        return writer.batches
+
+    assert asyncio.run(scenario()) == [[(1, "pushups", 1), (1, "pushups", 2)]]
+
+
+def test_shutdown_drains_buffer(monkeypatch):
+    writer = RecordingWriter()
+    closed = []
+    monkeypatch.setattr(async_db, "activity_buffer", ActivityBuffer(writer, flush_interval=10))
+    monkeypatch.setattr(db, "close_connections", lambda: closed.append(True))
+
+    async def scenario():
+        await async_db.activity_buffer.add(3, "running", 5.5)
+        await async_db.shutdown()
+        with pytest.raises(RuntimeError):
+            await async_db.activity_buffer.add(3, "running", 1)
+
+    asyncio.run(scenario())
+    assert writer.batches == [[(3, "running", 5.5)]]
+    assert closed == [True]
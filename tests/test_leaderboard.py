@@ -0,0 +1,125 @@
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+
+from bot import async_db, db, leaderboard
+from bot.leaderboard import PERIOD_DAYS, LeaderboardEngine
+
+TODAY = date(2026, 3, 15)
+
+
+def freeze(monkeypatch, day: date) -> None:
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return cls(day.year, day.month, day.day, 12)
+
+    monkeypatch.setattr(leaderboard, "datetime", FrozenDatetime)
+
+
+def totals(engine: LeaderboardEngine, category: str = "run"):
+    return {
+        period: [row["total"] for row in engine.top(category, period)]
+        for period in ("day", "week", "month", "all")
+    }
+
+
+def test_windows_roll_over_with_the_date(monkeypatch):
+    freeze(monkeypatch, TODAY)
+    daily = [
+        (1, "run", TODAY.isoformat(), 5.0),
+        (1, "run", (TODAY - timedelta(days=7)).isoformat(), 3.0),
+        (1, "run", (TODAY - timedelta(days=30)).isoformat(), 2.0),
+    ]
+    engine = LeaderboardEngine.from_snapshot(
+        [(1, "Иван", "Москва", "approved")], daily, [(1, "run", 10.0)], TODAY
+    )
+    assert totals(engine) == {"day": [5.0], "week": [8.0], "month": [10.0], "all": [10.0]}
+
+    freeze(monkeypatch, TODAY + timedelta(days=1))
+    assert totals(engine) == {"day": [], "week": [5.0], "month": [8.0], "all": [10.0]}
+
+    freeze(monkeypatch, TODAY + timedelta(days=24))
+    assert totals(engine) == {"day": [], "week": [], "month": [5.0], "all": [10.0]}
+
+    freeze(monkeypatch, TODAY + timedelta(days=31))
+    assert totals(engine) == {"day": [], "week": [], "month": [], "all": [10.0]}
+
+
+def test_user_registered_after_load_is_ranked(monkeypatch):
+    freeze(monkeypatch, TODAY)
+    engine = LeaderboardEngine.from_snapshot([(1, "Иван", "Москва", "approved")], [], [], TODAY)
+    engine.record(1, "run", 4.0, datetime(2026, 3, 15, 9))
+    # Регистрация, одобрение и первая запись уже после загрузки
+    engine.set_profile(2, "Мария", "Казань")
+    engine.set_status(2, "pending")
+    engine.record(2, "run", 6.0, datetime(2026, 3, 15, 10))
+    assert [row["full_name"] for row in engine.top("run", "day")] == ["Иван"]
+    engine.set_status(2, "approved")
+    assert engine.top("run", "week") == [
+        {"full_name": "Мария", "city": "Казань", "total": 6.0},
+        {"full_name": "Иван", "city": "Москва", "total": 4.0},
+    ]
+
+
+def test_status_change_removes_user_from_rankings(monkeypatch):
+    freeze(monkeypatch, TODAY)
+    users = [(1, "Иван", "Москва", "approved"), (2, "Мария", "Казань", "approved")]
+    daily = [(1, "run", TODAY.isoformat(), 5.0), (2, "run", TODAY.isoformat(), 7.0)]
+    engine = LeaderboardEngine.from_snapshot(users, daily, [(1, "run", 5.0), (2, "run", 7.0)], TODAY)
+    engine.set_status(2, "banned")
+    for period in ("day", "week", "month", "all"):
+        assert [row["full_name"] for row in engine.top("run", period)] == ["Иван"]
+    # Новые записи забаненного не возвращают его в рейтинг
+    engine.record(2, "run", 1.0, datetime(2026, 3, 15, 11))
+    assert [row["full_name"] for row in engine.top("run", "day")] == ["Иван"]
+    engine.set_status(2, "approved")
+    assert [row["total"] for row in engine.top("run", "day")] == [8.0, 5.0]
+
+
+def test_engine_agrees_with_database(monkeypatch):
+    monkeypatch.setattr(async_db, "leaderboard", None)
+
+    async def scenario():
+        await async_db.init_db()
+        await async_db.load_categories()
+        category = async_db.categories.keys()[0]
+        now = int(time.time())
+        day = 86400
+        for offset, user_id in enumerate(range(1500, 1505)):
+            await async_db.add_user(user_id, f"Участник {user_id}", "+7", "Пермь", 30)
+            await async_db.set_user_status(user_id, "approved")
+            db.add_activities(
+                [
+                    (user_id, category, 10.0 + offset, now),
+                    (user_id, category, 3.0 + offset, now - 3 * day),
+                    (user_id, category, 20.0 + offset, now - 20 * day),
+                    (user_id, category, 40.0 + offset, now - 200 * day),
+                    (user_id, category, 1.0 + offset, now - 500 * day),
+                ]
+            )
+        await async_db.load_leaderboard()
+        # После загрузки: новая запись, бан и участник, зарегистрированный позже
+        await async_db.add_activities([(1500, category, 100.0, now)])
+        await async_db.set_user_status(1501, "banned")
+        await async_db.add_user(1505, "Участник 1505", "+7", "Пермь", 30)
+        await async_db.set_user_status(1505, "approved")
+        await async_db.add_activities([(1505, category, 7.5, now)])
+
+        mismatches = {}
+        ranked = set()
+        for period in PERIOD_DAYS:
+            memory = [(row["full_name"], row["total"]) for row in await async_db.get_period_leaderboard(category, period)]
+            fallback = [
+                (row["full_name"], row["total"])
+                for row in await async_db.get_leaderboard(category, db.format_period(period))
+            ]
+            if memory != fallback:
+                mismatches[period] = (memory, fallback)
+            ranked.update(name for name, _ in memory)
+        return mismatches, ranked
+
+    mismatches, ranked = asyncio.run(scenario())
+    assert mismatches == {}
+    assert {"Участник 1500", "Участник 1505"} <= ranked
+    assert "Участник 1501" not in ranked
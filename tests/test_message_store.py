@@ -0,0 +1,82 @@
+import asyncio
+
+from bot import async_db
+from bot.message_store import MessageIdStore
+
+
+def test_evicted_chat_is_read_back_from_database(monkeypatch):
+    reads = []
+    original = async_db.get_last_message_id
+
+    async def counting_read(chat_id):
+        reads.append(chat_id)
+        return await original(chat_id)
+
+    monkeypatch.setattr(async_db, "get_last_message_id", counting_read)
+
+    async def scenario():
+        await async_db.init_db()
+        store = MessageIdStore(maxsize=2, flush_interval=10)
+        for chat_id, message_id in ((1800, 11), (1801, 12), (1802, 13)):
+            store.set(chat_id, message_id)
+        await store.close()
+        # 1800 вытеснен из LRU и читается из базы, 1802 — из памяти
+        return await store.get(1800), await store.get(1802)
+
+    assert asyncio.run(scenario()) == (11, 13)
+    assert reads == [1800]
+
+
+def test_flush_after_interval_and_at_max_dirty(monkeypatch):
+    saves = []
+
+    async def recording_save(rows):
+        saves.append(sorted(rows))
+
+    monkeypatch.setattr(async_db, "save_last_message_ids", recording_save)
+
+    async def scenario():
+        store = MessageIdStore(flush_interval=0.02, max_dirty=3)
+        store.set(1900, 1)
+        store.set(1900, 2)
+        await asyncio.sleep(0.05)
+        after_interval = list(saves)
+        store = MessageIdStore(flush_interval=10, max_dirty=3)
+        for chat_id in (1901, 1902, 1903):
+            store.set(chat_id, chat_id)
+        await asyncio.sleep(0.01)
+        return after_interval, saves[len(after_interval):]
+
+    after_interval, at_max_dirty = asyncio.run(scenario())
+    # Два set одного чата склеиваются в одну запись
+    assert after_interval == [[(1900, 2)]]
+    assert at_max_dirty == [[(1901, 1901), (1902, 1902), (1903, 1903)]]
+
+
+def test_unsaved_ids_stay_bounded_while_database_fails(monkeypatch):
+    attempts = []
+
+    async def broken_save(rows):
+        attempts.append(len(rows))
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(async_db, "save_last_message_ids", broken_save)
+
+    async def scenario():
+        store = MessageIdStore(maxsize=5, flush_interval=0.02, max_dirty=2)
+        for chat_id in range(2000, 2020):
+            store.set(chat_id, chat_id)
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.03)
+        store.set(2003, 1)
+        dirty = dict(store._dirty)
+        store._timer.cancel()
+        return dirty
+
+    dirty = asyncio.run(scenario())
+    assert len(dirty) <= 5
+    # Остаются самые свежие изменения
+    assert list(dirty)[-1] == 2003 and dirty[2003] == 1
+    assert set(dirty) - {2003} <= set(range(2015, 2020))
+    # Ошибка базы не превращает каждый set в новую попытку записи
+    assert len(attempts) < 5
@@ -0,0 +1,130 @@
+import sqlite3
+
+import pytest
+
+from bot import migrations
+
+
+def baseline_db() -> sqlite3.Connection:
+    """База в схеме до миграций, как ее создавал исходный init_db."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        """
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY,
+            full_name TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            city TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            last_activity_at TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE activities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            value REAL NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE activity_daily (
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            day TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, category, day)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        "INSERT INTO users VALUES (1, 'Иван', '+7', 'Москва', 30, 'approved', 'вчера', '2024-05-01T10:00:00.123')"
+    )
+    conn.executemany(
+        "INSERT INTO activities (user_id, category, value, created_at) VALUES (1, 'pushups', ?, ?)",
+        [(10, "2024-05-01 10:00:00"), (20, "не дата"), (30, "2024-05-02T08:00:00.5")],
+    )
+    conn.commit()
+    return conn
+
+
+def tables(conn: sqlite3.Connection) -> set:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_unparseable_timestamps_are_migrated():
+    conn = baseline_db()
+    assert migrations.migrate(conn) == [1, 2, 3]
+
+    created = [row[0] for row in conn.execute("SELECT created_at FROM activities ORDER BY id")]
+    # Нераспознанное время берется у предыдущей записи
+    assert created == [1714557600, 1714557600, 1714636800]
+    user_created, last_activity = conn.execute("SELECT created_at, last_activity_at FROM users").fetchone()
+    assert user_created > 0
+    assert last_activity == 1714557600
+
+
+def test_failed_step_is_rolled_back(monkeypatch):
+    conn = baseline_db()
+
+    def broken(conn: sqlite3.Connection) -> None:
+        conn.execute("CREATE TABLE users_new (user_id INTEGER PRIMARY KEY)")
+        conn.execute("DROP TABLE activity_daily")
+        raise sqlite3.IntegrityError("NOT NULL constraint failed")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [(1, "broken", broken)])
+    with pytest.raises(sqlite3.IntegrityError):
+        migrations.migrate(conn)
+    assert "users_new" not in tables(conn)
+    assert "activity_daily" in tables(conn)
+    assert migrations.schema_version(conn) == 0
+
+    monkeypatch.undo()
+    assert migrations.migrate(conn) == [1, 2, 3]
+    assert migrations.migrate(conn) == []
+
+
+def schema(conn: sqlite3.Connection) -> dict:
+    """Столбцы, индексы и внешние ключи таблиц, которые меняют миграции."""
+    result = {}
+    for name in ("users", "categories", "activities", "activity_daily"):
+        columns = [tuple(row)[1:] for row in conn.execute(f"PRAGMA table_info({name})")]
+        indexes = {
+            row[1]: [column[2] for column in conn.execute(f"PRAGMA index_info({row[1]})")]
+            for row in conn.execute(f"PRAGMA index_list({name})")
+        }
+        foreign_keys = sorted(tuple(row)[2:5] for row in conn.execute(f"PRAGMA foreign_key_list({name})"))
+        result[name] = (columns, indexes, foreign_keys)
+    return result
+
+
+def test_new_database_gets_the_migrated_schema():
+    fresh = sqlite3.connect(":memory:")
+    migrations.create_schema(fresh)
+    assert migrations.migrate(fresh) == []
+    assert migrations.schema_version(fresh) == len(migrations.MIGRATIONS)
+
+    migrated = baseline_db()
+    migrations.migrate(migrated)
+    assert schema(fresh) == schema(migrated)
+    categories = "SELECT id, key, label, activity_button, rating_button, position FROM categories ORDER BY id"
+    assert fresh.execute(categories).fetchall() == migrated.execute(categories).fetchall()
+
+
+def test_baseline_without_daily_rollup_is_migrated():
+    # Исходный init_db создавал только users и activities
+    conn = baseline_db()
+    conn.execute("DROP TABLE activity_daily")
+    assert migrations.migrate(conn) == [1, 2, 3]
+
+    fresh = sqlite3.connect(":memory:")
+    migrations.create_schema(fresh)
+    assert schema(conn) == schema(fresh)
+    assert conn.execute("SELECT COUNT(*) FROM activities").fetchone()[0] == 3
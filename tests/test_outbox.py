@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from bot import async_db, db
+from bot.outbox import NotificationOutbox
+from bot.ratelimit import TokenBucket
+
+
+def statuses(chat_id: int) -> list:
+    with db.get_connection() as conn:
+        rows = conn.execute(
+            "SELECT text, status FROM notification_outbox WHERE chat_id = ? ORDER BY id", (chat_id,)
+        ).fetchall()
+        return [(row["text"], row["status"]) for row in rows]
+
+
+def test_enqueue_during_delivery_is_not_lost():
+    db.init_db()
+    chat_id = 501
+    db.enqueue_notification(chat_id, "одобрено", None, True, f"status:{chat_id}", 0)
+    claimed = db.claim_notifications(time.time(), 50)
+    assert [row["text"] for row in claimed if row["chat_id"] == chat_id] == ["одобрено"]
+
+    # Пока «одобрено» отправляется, админ банит пользователя
+    db.enqueue_notification(chat_id, "бан", None, True, f"status:{chat_id}", 0)
+    sent_id = next(row["id"] for row in claimed if row["chat_id"] == chat_id)
+    db.complete_notifications([(sent_id, "sent", 1, time.time(), None)])
+    assert statuses(chat_id) == [("одобрено", "sent"), ("бан", "pending")]
+
+
+def test_retry_of_superseded_notification_is_dropped():
+    db.init_db()
+    chat_id = 502
+    db.enqueue_notification(chat_id, "старое", None, False, f"status:{chat_id}", 0)
+    claimed = [row for row in db.claim_notifications(time.time(), 50) if row["chat_id"] == chat_id]
+    db.enqueue_notification(chat_id, "новое", None, False, f"status:{chat_id}", 0)
+    db.complete_notifications([(claimed[0]["id"], "pending", 1, time.time() + 60, "timeout")])
+    assert statuses(chat_id) == [("старое", "superseded"), ("новое", "pending")]
+
+    # Повторный запуск возвращает в очередь только то, что не заменено
+    db.claim_notifications(time.time(), 50)
+    assert db.release_claimed_notifications() >= 1
+    assert statuses(chat_id)[-1] == ("новое", "pending")
+
+
+class FakeBot:
+    def __init__(self, outbox_ref: list) -> None:
+        self.sent = []
+        self.outbox_ref = outbox_ref
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        if text == "одобрено":
+            # Админ нажимает «бан», пока идет отправка
+            await self.outbox_ref[0].enqueue(chat_id, "бан", dedup_key=f"status:{chat_id}")
+        self.sent.append((chat_id, text))
+
+
+def test_outbox_delivers_notification_enqueued_while_sending():
+    async def scenario():
+        await async_db.init_db()
+        refs: list = []
+        bot = FakeBot(refs)
+        outbox = NotificationOutbox(bot, TokenBucket(1000, 1000), send_compact=None)
+        refs.append(outbox)
+        await outbox.enqueue(503, "одобрено", dedup_key="status:503")
+        outbox.start()
+        for _ in range(100):
+            if (503, "бан") in bot.sent:
+                break
+            await asyncio.sleep(0.05)
+        await outbox.stop()
+        return bot.sent
+
+    sent = asyncio.run(scenario())
+    assert [text for chat_id, text in sent if chat_id == 503] == ["одобрено", "бан"]
+
+
+def test_claim_takes_only_own_shard():
+    db.init_db()
+    for chat_id in (610, 611, -613):
+        db.enqueue_notification(chat_id, "шард", None, True, None, 0)
+    by_shard = {
+        shard: {row["chat_id"] for row in db.claim_notifications(time.time(), 50, shard, 2) if row["text"] == "шард"}
+        for shard in (0, 1)
+    }
+    # Как shard_key(update) % WORKERS в ShardedDispatcher
+    assert by_shard == {0: {610}, 1: {611, -613}}
@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot import proxy as proxy_module
+from bot.proxy import ProbeResult, make_session, probe_proxy
+
+
+def test_make_session_keeps_pool_options_for_socks_proxy():
+    session = make_session("socks5://127.0.0.1:9050")
+    assert session._connector_init["limit"] > 0
+    assert session._connector_init["keepalive_timeout"] > 0
+    assert "proxy_type" in session._connector_init
+
+    session.proxy = "socks5://127.0.0.1:9051"
+    assert session._connector_init["port"] == 9051
+    assert "limit" in session._connector_init
+
+
+def test_probe_proxy_reports_bad_proxy_as_failed_result():
+    proxy = {"url": "bogus://nowhere", "country": "-", "city": "-"}
+    result = asyncio.run(probe_proxy("123456:TEST", proxy, timeout=1))
+    assert result.bot is None
+    assert result.error
+
+
+class FakeSession:
+    def __init__(self) -> None:
+        self.closed = False
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def test_pool_reuses_open_sessions_of_race_losers(monkeypatch):
+    latencies = {"a": 0.03, "b": 0.01, "c": 0.02}
+
+    async def fake_probe(token, proxy, timeout):
+        await asyncio.sleep(latencies[proxy["url"]])
+        bot = SimpleNamespace(session=FakeSession())
+        return ProbeResult(proxy=proxy, latency=latencies[proxy["url"]], bot=bot)
+
+    monkeypatch.setattr(proxy_module, "probe_proxy", fake_probe)
+    proxies = [{"url": url, "country": "-", "city": "-"} for url in latencies]
+    best, results = asyncio.run(
+        proxy_module.race_proxies("123456:TEST", proxies, concurrency=3, timeout=1, grace=0.1)
+    )
+    assert best.proxy["url"] == "b"
+
+    pool = proxy_module.build_pool(results)
+    assert len(pool.members) == 3
+    assert not any(member.session.closed for member in pool.members)
@@ -0,0 +1,51 @@
+import asyncio
+import multiprocessing
+
+import pytest
+
+from bot.ratelimit import SharedRateLimiter, TokenBucket
+
+
+def test_rate_below_one_still_grants_tokens():
+    async def scenario():
+        bucket = TokenBucket(0.5)
+        await asyncio.wait_for(bucket.acquire(), timeout=1)
+        return bucket.capacity
+
+    assert asyncio.run(scenario()) == 1.0
+
+
+@pytest.mark.parametrize("rate", [0, -1])
+def test_non_positive_rate_is_rejected(rate):
+    with pytest.raises(ValueError):
+        TokenBucket(rate)
+
+
+def test_rate_is_respected():
+    async def scenario():
+        bucket = TokenBucket(50, capacity=1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(6):
+            await bucket.acquire()
+        return loop.time() - started
+
+    # Первый токен сразу, остальные пять — по 20 мс
+    assert asyncio.run(scenario()) >= 0.09
+
+
+def test_shared_limiter_spaces_slots_and_pauses():
+    async def scenario():
+        limiter = SharedRateLimiter(50, multiprocessing.get_context("spawn"))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*(limiter.acquire() for _ in range(6)))
+        spaced = loop.time() - started
+        limiter.pause(0.1)
+        started = loop.time()
+        await limiter.acquire()
+        return spaced, loop.time() - started
+
+    spaced, paused = asyncio.run(scenario())
+    assert spaced >= 0.09
+    assert paused >= 0.09
@@ -0,0 +1,66 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.methods import GetMe, GetUpdates
+
+from bot.scheduler import UpdateScheduler
+
+
+def key(chat_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+def test_chat_order_and_concurrency_limit():
+    async def scenario():
+        scheduler = UpdateScheduler(concurrency=2, max_pending=100)
+        log = []
+        running = 0
+        peak = 0
+
+        async def handle(chat_id: int, index: int) -> None:
+            nonlocal running, peak
+            async with scheduler.lock(key(chat_id)):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01 if index % 2 else 0.001)
+                log.append((chat_id, index))
+                running -= 1
+
+        await asyncio.gather(*(handle(chat_id, index) for index in range(5) for chat_id in (1, 2, 3)))
+        return scheduler, log, peak
+
+    scheduler, log, peak = asyncio.run(scenario())
+    for chat_id in (1, 2, 3):
+        assert [index for chat, index in log if chat == chat_id] == list(range(5))
+    assert peak == 2
+    assert scheduler.stats()["processed"] == 15
+    assert scheduler.stats()["chats"] == 0
+
+
+def test_hold_updates_waits_for_room():
+    async def scenario():
+        scheduler = UpdateScheduler(concurrency=1, max_pending=1)
+        requests = []
+
+        async def make_request(bot, method):
+            requests.append(type(method).__name__)
+
+        release = asyncio.Event()
+
+        async def busy() -> None:
+            async with scheduler.lock(key(1)):
+                await release.wait()
+
+        task = asyncio.create_task(busy())
+        await asyncio.sleep(0)
+        await scheduler.hold_updates(make_request, None, GetMe())
+        poll = asyncio.create_task(scheduler.hold_updates(make_request, None, GetUpdates()))
+        await asyncio.sleep(0.01)
+        held = list(requests)
+        release.set()
+        await asyncio.gather(task, poll)
+        return held, requests
+
+    held, requests = asyncio.run(scenario())
+    assert held == ["GetMe"]
+    assert requests == ["GetMe", "GetUpdates"]
@@ -0,0 +1,45 @@
+import asyncio
+
+from bot import async_db, db
+
+
+def add_users():
+    statuses = ["approved", "pending", "banned"]
+    for user_id in range(1600, 1611):
+        db.add_user(user_id, f"Участник {user_id}", "+7", "Уфа", 30)
+        db.set_user_status(user_id, statuses[user_id % 3])
+
+
+def expected(statuses):
+    return sorted(row["user_id"] for row in db.list_users_by_status(statuses))
+
+
+def test_iter_users_walks_every_status_in_id_order():
+    db.init_db()
+    add_users()
+    statuses = ["approved", "pending"]
+    rows = list(db.iter_users(statuses, chunk_size=2, columns=("full_name",)))
+    assert [row["user_id"] for row in rows] == expected(statuses)
+    names = {row["user_id"]: row["full_name"] for row in rows if 1600 <= row["user_id"] < 1611}
+    assert names == {user_id: f"Участник {user_id}" for user_id in range(1600, 1611) if user_id % 3 != 2}
+
+
+def test_async_iter_users_matches_sync_scan():
+    async def scenario():
+        await async_db.init_db()
+        add_users()
+        return [user_id async for user_id in async_db.get_registered_users(["banned"])]
+
+    assert asyncio.run(scenario()) == expected(["banned"])
+
+
+def test_users_chunk_query_uses_index_order():
+    db.init_db()
+    with db.get_read_connection() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT user_id FROM users WHERE status = ? AND user_id > ? ORDER BY user_id LIMIT ?",
+            ("approved", 0, 10),
+        ).fetchall()
+    details = " ".join(row[3] for row in plan)
+    assert "idx_users_status_user" in details
+    assert "TEMP B-TREE" not in details
@@ -0,0 +1,63 @@
+from bot import db
+from bot.main import parse_users_page_callback, users_page_callback
+
+# Отдельные статусы, чтобы не видеть пользователей из других тестов
+STATUSES = ["page-a", "page-b"]
+# Несколько пользователей с одинаковым created_at
+CREATED = {1700: 1000, 1701: 1000, 1702: 1000, 1703: 2000, 1704: 2000, 1705: 3000, 1706: 4000}
+
+
+def add_users():
+    db.init_db()
+    for index, (user_id, created_at) in enumerate(CREATED.items()):
+        db.add_user(user_id, f"Участник {user_id}", "+7", "Тверь", 30)
+        db.set_user_status(user_id, STATUSES[index % 2])
+        with db.get_connection() as conn:
+            conn.execute("UPDATE users SET created_at = ? WHERE user_id = ?", (created_at, user_id))
+
+
+def cursor(row):
+    return row["created_at"], row["user_id"]
+
+
+def test_pages_forward_and_back():
+    add_users()
+    expected = sorted(CREATED, key=lambda user_id: (CREATED[user_id], user_id), reverse=True)
+
+    pages = []
+    rows, has_prev, has_next = db.list_users_page(STATUSES, 3)
+    assert not has_prev
+    pages.append([row["user_id"] for row in rows])
+    while has_next:
+        rows, has_prev, has_next = db.list_users_page(STATUSES, 3, after=cursor(rows[-1]))
+        assert has_prev
+        pages.append([row["user_id"] for row in rows])
+    assert pages == [expected[0:3], expected[3:6], expected[6:]]
+
+    # Назад от последней страницы — те же страницы в обратном порядке
+    back = [pages[-1]]
+    first = pages[-1][0]
+    has_prev = True
+    while has_prev:
+        rows, has_prev, has_next = db.list_users_page(STATUSES, 3, before=(CREATED[first], first))
+        assert has_next
+        back.append([row["user_id"] for row in rows])
+        first = rows[0]["user_id"]
+    assert back == pages[::-1]
+
+
+def test_page_callback_round_trip_and_garbage():
+    user = {"user_id": 1703, "created_at": 2000}
+    assert parse_users_page_callback(users_page_callback("members", "next", user)) == (
+        "members",
+        "next",
+        (2000, 1703),
+    )
+    for data in (
+        "users:members:next:abc:2000",
+        "users:members:next:1703",
+        "users:unknown:next:1703:2000",
+        "users:members:sideways:1703:2000",
+        "users:members:next:1703:2000:1",
+    ):
+        assert parse_users_page_callback(data) is None
@@ -0,0 +1,139 @@
+"""
+Режим вебхука: обновления приходят в aiohttp-приложение вместо long polling.
+
+Telegram хранит обновления, пока бот недоступен, поэтому после
+перезапуска они не теряются, а за балансировщиком можно держать
+несколько экземпляров. В локальном тестовом режиме вебхук в Telegram не
+регистрируется, обновления присылает post_fake_updates, а бот отвечает
+через FakeTelegramSession (см. bot.main.create_bot). Вебхук в этом режиме
+отвечает только после завершения обработчика, так что замеренная задержка —
+это время обработки обновления целиком. При WORKERS > 1 приемник отвечает,
+как только положил обновление в очередь воркера, и задержка обработку не
+включает.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, List
+
+from aiogram import Bot, Dispatcher
+from aiohttp import ClientSession, TCPConnector, web
+
+from bot.config import settings
+from bot.scheduler import UpdateScheduler
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Telegram держит соединения открытыми, не закрываем их между запросами
+KEEPALIVE_TIMEOUT = 75.0
+
+
+def build_app(dp: Dispatcher, bot: Bot, scheduler: UpdateScheduler, **workflow_data: Any) -> web.Application:
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+    class AdmittingRequestHandler(SimpleRequestHandler):
+        # Пока очередь обновлений полна, не отвечаем Telegram: он не пришлет
+        # больше max_connections обновлений, не дождавшись ответов
+        async def handle(self, request: web.Request) -> web.Response:
+            await scheduler.admit()
+            return await super().handle(request)
+
+    app = web.Application()
+    AdmittingRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings.webhook_secret or None,
+        # В бою отвечаем сразу, а в локальном прогоне — после обработки, чтобы мерить ее
+        handle_in_background=not settings.webhook_local_test,
+        **workflow_data,
+    ).register(app, path=settings.webhook_path)
+    setup_application(app, dp, bot=bot, **workflow_data)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, scheduler: UpdateScheduler, **workflow_data: Any) -> None:
+    await serve_webhook(build_app(dp, bot, scheduler, **workflow_data), dp, bot)
+
+
+async def serve_webhook(app: web.Application, dp: Dispatcher, bot: Bot) -> None:
+    """Запускает app и регистрирует вебхук; возвращается после остановки сервера."""
+    runner = web.AppRunner(app, keepalive_timeout=KEEPALIVE_TIMEOUT)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.webhook_host, port=settings.webhook_port)
+    await site.start()
+    print(f"🌐 Вебхук слушает {settings.webhook_host}:{settings.webhook_port}{settings.webhook_path}")
+    try:
+        if settings.webhook_local_test:
+            url = f"http://127.0.0.1:{settings.webhook_port}{settings.webhook_path}"
+            await post_fake_updates(url, settings.webhook_secret)
+            # При WORKERS > 1 вызовы делают боты воркеров, здесь их нет
+            calls = getattr(bot.session, "calls", None)
+            if calls:
+                print(f"🤖 Вызовы Bot API: {dict(calls.most_common())}")
+            return
+        if not settings.webhook_base_url:
+            raise RuntimeError("Для режима webhook укажите WEBHOOK_BASE_URL")
+        await bot.set_webhook(
+            url=settings.webhook_base_url.rstrip("/") + settings.webhook_path,
+            secret_token=settings.webhook_secret or None,
+            max_connections=settings.webhook_max_connections,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=False,
+        )
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
+
+
+def fake_update(update_id: int, user_id: int, text: str) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": f"Тест {user_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+async def post_fake_updates(
+    url: str, secret: str, count: int = 200, users: int = 50, concurrency: int = 10
+) -> List[float]:
+    """
+    Отправляет в вебхук count синтетических обновлений от users пользователей
+    и печатает задержку ответа (в одном процессе — до конца обработки).
+    Соединения переиспользуются (keep-alive).
+    """
+    texts = ["/start", "🏆 Рейтинг", "ℹ️ О себе", "✍️ Записать"]
+    headers = {SECRET_HEADER: secret} if secret else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async with ClientSession(connector=TCPConnector(limit=concurrency)) as session:
+
+        async def post(update_id: int) -> None:
+            payload = fake_update(update_id, 10_000 + random.randrange(users), random.choice(texts))
+            async with semaphore:
+                started = time.monotonic()
+                async with session.post(url, json=payload, headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        logger.warning("Вебхук ответил %s на обновление %s", response.status, update_id)
+                latencies.append(time.monotonic() - started)
+
+        await asyncio.gather(*(post(update_id) for update_id in range(1, count + 1)))
+
+    latencies.sort()
+    if latencies:
+        print(
+            f"📨 Отправлено {len(latencies)} обновлений: "
+            f"p50 {latencies[len(latencies) // 2] * 1000:.1f} мс, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} мс"
+        )
+    return latencies
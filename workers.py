@@ -0,0 +1,230 @@
+"""
+Запуск в несколько процессов: приемник раздает обновления воркерам.
+
+Приемник (polling или вебхук) не разбирает обновления, а только кладет
+их JSON в очередь воркера, выбранного по chat_id % WORKERS. Все
+обновления одного чата обрабатывает один процесс (по порядку — см.
+bot.scheduler). Очередь уведомлений каждого воркера отправляет только
+уведомления своих чатов, поэтому FSM и последний message_id чата
+меняет один процесс и его кэши не расходятся с базой.
+
+Кэши пользователей, рейтингов и индекс админов общие для всех чатов и
+в воркерах живут не дольше WORKER_CACHE_TTL: изменения из соседних
+процессов они видят с этой задержкой. Например, бан или одобрение,
+сделанные админом в одном воркере, в остальных начинают действовать
+через время до WORKER_CACHE_TTL секунд. Незавершенные рассылки
+возобновляет воркер 0: сообщения рассылки идут через send_message и
+кэш message_id не трогают.
+
+Лимит отправки SEND_RATE_LIMIT общий для всех воркеров (SharedRateLimiter):
+рассылка идет на полной скорости в том воркере, где ее запустил админ,
+а все процессы вместе не превышают лимит Telegram.
+
+При остановке приемник перестает принимать обновления, отправляет
+воркерам маркер завершения и ждет, пока они дообработают свои очереди.
+"""
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import signal
+from typing import Any, Dict, List, Optional, Set
+
+from bot import async_db
+from bot.config import settings
+from bot.ratelimit import SharedRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Маркер завершения в очереди воркера
+STOP = None
+
+
+def shard_key(update: Dict[str, Any]) -> int:
+    """chat_id обновления, а для событий без чата — id пользователя."""
+    for field, event in update.items():
+        if field == "update_id" or not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        sender = event.get("from") or event.get("user")
+        if sender:
+            return sender["id"]
+    return 0
+
+
+class ShardedDispatcher:
+    """Очереди воркеров и отправка обновлений в нужную из них."""
+
+    def __init__(self, count: int, queue_size: int) -> None:
+        context = multiprocessing.get_context("spawn")
+        self.queues = [context.Queue(maxsize=queue_size) for _ in range(count)]
+        self.send_limiter = SharedRateLimiter(settings.send_rate_limit, context)
+        self.processes = [
+            context.Process(
+                target=worker_entry,
+                args=(index, count, queue, self.send_limiter),
+                name=f"bot-worker-{index}",
+                daemon=True,
+            )
+            for index, queue in enumerate(self.queues)
+        ]
+
+    def start(self) -> None:
+        for process in self.processes:
+            process.start()
+
+    async def dispatch(self, update: Dict[str, Any]) -> None:
+        queue = self.queues[shard_key(update) % len(self.queues)]
+        # Полная очередь блокирует put — ждем в потоке, не останавливая прием
+        await asyncio.get_running_loop().run_in_executor(None, queue.put, update)
+
+    async def drain(self, timeout: float) -> None:
+        loop = asyncio.get_running_loop()
+        for queue in self.queues:
+            await loop.run_in_executor(None, queue.put, STOP)
+        deadline = loop.time() + timeout
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, max(0.0, deadline - loop.time()))
+            if process.is_alive():
+                logger.warning("Воркер %s не завершился за %.0f с, останавливаем", process.name, timeout)
+                process.terminate()
+
+
+async def run_sharded() -> None:
+    from bot.main import create_bot, dp
+
+    sharded = ShardedDispatcher(settings.workers, settings.worker_queue_size)
+    bot = await create_bot()
+    sharded.start()
+    print(f"🧩 Обновления обрабатывают {settings.workers} процессов")
+    try:
+        if settings.run_mode == "webhook":
+            from bot.webhook import serve_webhook
+
+            await serve_webhook(_receiver_app(sharded), dp, bot)
+        else:
+            await _poll(bot, dp, sharded)
+    finally:
+        await sharded.drain(settings.worker_drain_timeout)
+        await bot.session.close()
+
+
+def _receiver_app(sharded: ShardedDispatcher):
+    from aiohttp import web
+
+    from bot.webhook import SECRET_HEADER
+
+    secret = settings.webhook_secret
+
+    async def receive(request: web.Request) -> web.Response:
+        if secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=401, text="Unauthorized")
+        await sharded.dispatch(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(settings.webhook_path, receive)
+    return app
+
+
+async def _poll(bot, dp, sharded: ShardedDispatcher) -> None:
+    # Как skip_updates=True в одном процессе: накопленные за простой обновления пропускаем
+    await bot.delete_webhook(drop_pending_updates=True)
+    allowed_updates = dp.resolve_used_update_types()
+    offset: Optional[int] = None
+    try:
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates)
+            except Exception as exc:
+                logger.error("Не удалось получить обновления: %s", exc)
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                await sharded.dispatch(update.model_dump(mode="json", exclude_unset=True))
+                offset = update.update_id + 1
+    finally:
+        if offset is not None:
+            # Подтверждаем уже розданные обновления, чтобы Telegram не прислал их снова
+            try:
+                await bot.get_updates(offset=offset, timeout=0, limit=1)
+            except Exception:
+                pass
+
+
+def worker_entry(index: int, count: int, queue, send_limiter: SharedRateLimiter) -> None:
+    # Ctrl+C получает вся группа процессов; останавливает воркеры приемник
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_worker_main(index, count, queue, send_limiter))
+
+
+async def _worker_main(index: int, count: int, queue, send_limiter: SharedRateLimiter) -> None:
+    from bot import main as app
+
+    # Рейтинги в памяти не видят активностей из других процессов — берем их из базы
+    for cache in (async_db.user_cache, async_db.leaderboard_cache):
+        cache.ttl = min(cache.ttl or settings.worker_cache_ttl, settings.worker_cache_ttl)
+    await async_db.load_categories()
+    await async_db.warm_user_cache()
+    await async_db.load_admin_index()
+
+    try:
+        bot = await app.create_bot()
+    except Exception:
+        await app.close_services(None, None)
+        raise
+    broadcaster, outbox = app.create_services(
+        bot, settings.send_rate_limit, shard=index, shards=count, send_limiter=send_limiter
+    )
+    loop = asyncio.get_running_loop()
+    running: Set[asyncio.Task] = set()
+
+    async def handle(update: Dict[str, Any]) -> None:
+        try:
+            await app.dp.feed_raw_update(bot, update, broadcaster=broadcaster, outbox=outbox)
+        except Exception:
+            logger.exception("Ошибка обработки обновления %s", update.get("update_id"))
+
+    admins_task: Optional[asyncio.Task] = None
+    if settings.worker_cache_ttl > 0:
+        admins_task = asyncio.create_task(_refresh_admin_index(settings.worker_cache_ttl))
+    try:
+        if index == 0:
+            await broadcaster.resume()
+        outbox.start()
+        app.fsm_storage.start()
+        app.scheduler.start()
+        while True:
+            # Порядок внутри чата и общий лимит обеспечивает UpdateScheduler;
+            # пока он переполнен, не забираем новые обновления из очереди
+            await app.scheduler.admit()
+            update = await loop.run_in_executor(None, queue.get)
+            if update is STOP:
+                break
+            task = asyncio.create_task(handle(update))
+            running.add(task)
+            task.add_done_callback(running.discard)
+        # Дообрабатываем уже полученные обновления
+        pending: List[asyncio.Task] = list(running)
+        if pending:
+            await asyncio.wait(pending)
+    finally:
+        if admins_task is not None:
+            admins_task.cancel()
+        try:
+            await app.close_services(broadcaster, outbox)
+        finally:
+            await bot.session.close()
+
+
+async def _refresh_admin_index(interval: float) -> None:
+    # Админа по телефону, зарегистрированного в другом воркере, узнаем при перечитывании
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await async_db.load_admin_index()
+        except Exception as exc:
+            logger.error("Не удалось обновить индекс админов: %s", exc)